@@ -6,9 +6,21 @@ import base64
  
 from urllib.parse import urljoin
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import async_http, http_client
+from utils.tracing import span
 
 load_dotenv()
 
+DRAFT_FIELDS = "{ draft { id title slug } }"
+POST_FIELDS = "{ post { id title slug url } }"
+
+
+class BatchRejected(Exception):
+    """The batched mutation was rejected as a whole (no per-alias errors)"""
+
+
 class Publisher:
     def __init__(self) -> None:
         # Hashnode credentials
@@ -43,107 +55,402 @@ class Publisher:
         }
         """
 
-    def publish_hash_node(self, content, title="The Ultimate Chewy Chocolate Chip Cookies", image_url=None):
-        """Publish content to Hashnode with optional image uploaded to Appwrite"""
-        MARKDOWN = content
-        
-        cover_image_url = image_url
-        banner_image_url = image_url 
-        
+        self.update_post_query = """
+        mutation updatePost($input: UpdatePostInput!) {
+            updatePost(input: $input) {
+                post {
+                    id
+                    title
+                    slug
+                    url
+                }
+            }
+        }
+        """
+
+    def _check_credentials(self):
         if not self.HASHNODE_PAT:
             print("❌ Error: HASHNODE_PAT environment variable not set")
-            return None
-            
+            return False
+
         if not self.PUBLICATION_ID:
             print("❌ Error: HASHNODE_PUB_ID environment variable not set")
-            return None
+            return False
+        return True
 
-        create_draft_variables = {
-            "input": {
-                "title": title,
-                "contentMarkdown": MARKDOWN,
-                "tags": [],   
-                "publicationId": self.PUBLICATION_ID,
-                "settings": {
-                    "delist": False,
-                    "enableTableOfContent": True
-                }
-            }
-        }
-        
-        
-        if cover_image_url:
-            create_draft_variables["input"]["coverImageOptions"] = {
-                "coverImageURL": cover_image_url
-            }
-            print(f"✅ Cover image set: {cover_image_url}")
-        
-        if banner_image_url:
-            create_draft_variables["input"]["bannerImageOptions"] = {
-                "bannerImageURL": banner_image_url
-            }
-            print(f"✅ Banner image set: {banner_image_url}")
-      
-        print(f"\nUsing Publication ID: {self.PUBLICATION_ID}")
-        
-        print("\nCreating draft...")
-        try:
-            response = requests.post(
+    def _graphql(self, query, variables, operation, idempotent=False):
+        """
+        Send one GraphQL operation to Hashnode and return the decoded body.
+        Operations are mutations, so retries are limited to responses that
+        were refused before running unless `idempotent` is set.
+        """
+        with span(f"hashnode.{operation}") as s:
+            response = http_client.post(
                 "https://gql.hashnode.com/",
+                provider="hashnode",
+                idempotent=idempotent,
                 headers={"Authorization": self.HASHNODE_PAT, "Content-Type": "application/json"},
-                json={"query": self.create_draft_query, "variables": create_draft_variables},
+                json={"query": query, "variables": variables},
             )
+            s.set(status_code=response.status_code, response_bytes=len(response.content))
             response.raise_for_status()
             data = response.json()
-            
             if "errors" in data:
-                print("❌ Error creating draft:", json.dumps(data["errors"], indent=2))
-                return None
-                
-            draft_data = data.get("data", {}).get("createDraft", {}).get("draft")
-            if not draft_data:
-                print("❌ Unexpected response structure:", json.dumps(data, indent=2))
-                return None
-                
-            print("\n✅ Draft created successfully!")
-            print(f"Draft ID: {draft_data['id']}")
-            print(f"Title: {draft_data['title']}")
-            print(f"Slug: {draft_data['slug']}")
-            
-            print("\nPublishing draft...")
-            publish_variables = {
-                "input": {
-                    "draftId": draft_data["id"]
-                }
-            }
-            
-            response = requests.post(
+                s.fail("GraphQL errors")
+            return data
+
+    async def _agraphql(self, query, variables, operation, idempotent=False):
+        """Async _graphql over the shared httpx client"""
+        with span(f"hashnode.{operation}") as s:
+            response = await async_http.post(
                 "https://gql.hashnode.com/",
+                provider="hashnode",
+                idempotent=idempotent,
                 headers={"Authorization": self.HASHNODE_PAT, "Content-Type": "application/json"},
-                json={"query": self.publish_draft_query, "variables": publish_variables},
+                json={"query": query, "variables": variables},
             )
+            s.set(status_code=response.status_code, response_bytes=len(response.content))
             response.raise_for_status()
             data = response.json()
-            
             if "errors" in data:
-                print("❌ Error publishing draft:", json.dumps(data["errors"], indent=2))
-                return None
-                
-            post_data = data.get("data", {}).get("publishDraft", {}).get("post")
-            if not post_data:
-                print("❌ Unexpected response structure:", json.dumps(data, indent=2))
-                return None
-                
-            print("\n✅ Post published successfully!")
-            print(f"Post ID: {post_data['id']}")
-            print(f"Title: {post_data['title']}")
-            print(f"Slug: {post_data['slug']}")
-            print(f"URL: {post_data['url']}")
-            
-            return post_data
+                s.fail("GraphQL errors")
+            return data
+
+    def _batched_mutation(self, field, input_type, selection, inputs, operation):
+        """
+        Runs one `field` mutation per input in a single request, using aliases.
+
+        Returns a list of (result, error) tuples in input order. Raises
+        BatchRejected when the request fails as a whole, i.e. errors come back
+        without any alias result; errors without a path are otherwise given to
+        the aliases that have no result, so succeeded ones are never redone.
+        """
+        declarations = ", ".join(f"$input{i}: {input_type}!" for i in range(len(inputs)))
+        fields = "\n".join(f"    p{i}: {field}(input: $input{i}) {selection}" for i in range(len(inputs)))
+        query = f"mutation {operation}({declarations}) {{\n{fields}\n}}"
+        variables = {f"input{i}": value for i, value in enumerate(inputs)}
+
+        data = self._graphql(query, variables, operation)
+        values = data.get("data") or {}
+        alias_errors = {}
+        general_error = None
+        for error in data.get("errors", []):
+            path = error.get("path") or []
+            message = error.get("message", "GraphQL error")
+            if path:
+                alias_errors.setdefault(path[0], message)
+            elif general_error is None:
+                general_error = message
+        if general_error is not None and not any(values.values()):
+            raise BatchRejected(general_error)
+
+        results = []
+        for i in range(len(inputs)):
+            value = values.get(f"p{i}")
+            error = alias_errors.get(f"p{i}") or (general_error if not value else None)
+            results.append((value if not error else None, error or (None if value else "Empty result")))
+        return results
+
+    def _draft_input(self, content, title, image_url=None):
+        return {
+            "title": title,
+            "contentMarkdown": content,
+            "tags": [],
+            "publicationId": self.PUBLICATION_ID,
+            "settings": {
+                "delist": False,
+                "enableTableOfContent": True
+            },
+            **self._image_options(image_url),
+        }
+
+    @staticmethod
+    def _image_options(image_url):
+        if not image_url:
+            return {}
+        print(f"✅ Cover image set: {image_url}")
+        print(f"✅ Banner image set: {image_url}")
+        return {
+            "coverImageOptions": {"coverImageURL": image_url},
+            "bannerImageOptions": {"bannerImageURL": image_url},
+        }
+
+    def create_draft(self, content, title, image_url=None):
+        """Create a Hashnode draft and return its id/title/slug, or None on failure"""
+        if not self._check_credentials():
+            return None
+
+        create_draft_variables = {
+            "input": self._draft_input(content, title, image_url)
+        }
+
+        print(f"\nUsing Publication ID: {self.PUBLICATION_ID}")
+
+        print("\nCreating draft...")
+        try:
+            data = self._graphql(self.create_draft_query, create_draft_variables, "createDraft")
+            return self._draft_result(data)
         except requests.exceptions.RequestException as e:
             print(f"❌ Network or API error during Hashnode operation: {e}")
             return None
         except json.JSONDecodeError as e:
             print(f"❌ JSON decode error during Hashnode operation: {e}")
             return None
+
+    @staticmethod
+    def _draft_result(data):
+        """Extract the created draft from a createDraft response, or None"""
+        if "errors" in data:
+            print("❌ Error creating draft:", json.dumps(data["errors"], indent=2))
+            return None
+
+        draft_data = data.get("data", {}).get("createDraft", {}).get("draft")
+        if not draft_data:
+            print("❌ Unexpected response structure:", json.dumps(data, indent=2))
+            return None
+
+        print("\n✅ Draft created successfully!")
+        print(f"Draft ID: {draft_data['id']}")
+        print(f"Title: {draft_data['title']}")
+        print(f"Slug: {draft_data['slug']}")
+        return draft_data
+
+    def publish_draft(self, draft_id):
+        """Publish an existing draft and return the post id/title/slug/url, or None on failure"""
+        if not self._check_credentials():
+            return None
+
+        print("\nPublishing draft...")
+        publish_variables = {
+            "input": {
+                "draftId": draft_id
+            }
+        }
+
+        try:
+            data = self._graphql(self.publish_draft_query, publish_variables, "publishDraft")
+            return self._publish_result(data)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Network or API error during Hashnode operation: {e}")
+            return None
+        except json.JSONDecodeError as e:
+            print(f"❌ JSON decode error during Hashnode operation: {e}")
+            return None
+
+    @staticmethod
+    def _publish_result(data):
+        """Extract the published post from a publishDraft response, or None"""
+        if "errors" in data:
+            print("❌ Error publishing draft:", json.dumps(data["errors"], indent=2))
+            return None
+
+        post_data = data.get("data", {}).get("publishDraft", {}).get("post")
+        if not post_data:
+            print("❌ Unexpected response structure:", json.dumps(data, indent=2))
+            return None
+
+        print("\n✅ Post published successfully!")
+        print(f"Post ID: {post_data['id']}")
+        print(f"Title: {post_data['title']}")
+        print(f"Slug: {post_data['slug']}")
+        print(f"URL: {post_data['url']}")
+        return post_data
+
+    def update_post_images(self, post_id, image_url):
+        """Set cover and banner image of an already published post, returns the post or None"""
+        if not self._check_credentials() or not image_url:
+            return None
+
+        print("\nUpdating post images...")
+        update_variables = {
+            "input": {
+                "id": post_id,
+                **self._image_options(image_url),
+            }
+        }
+
+        try:
+            # Setting the same images twice is harmless
+            data = self._graphql(self.update_post_query, update_variables, "updatePost", idempotent=True)
+            return self._updated_post_result(data)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Network or API error during Hashnode operation: {e}")
+            return None
+        except json.JSONDecodeError as e:
+            print(f"❌ JSON decode error during Hashnode operation: {e}")
+            return None
+
+    @staticmethod
+    def _updated_post_result(data):
+        """Extract the post from an updatePost response, or None"""
+        if "errors" in data:
+            print("❌ Error updating post images:", json.dumps(data["errors"], indent=2))
+            return None
+
+        post_data = data.get("data", {}).get("updatePost", {}).get("post")
+        if not post_data:
+            print("❌ Unexpected response structure:", json.dumps(data, indent=2))
+            return None
+        return post_data
+
+    def publish_hash_node(self, content, title="The Ultimate Chewy Chocolate Chip Cookies", image_url=None):
+        """Publish content to Hashnode with optional cover/banner image"""
+        draft_data = self.create_draft(content, title, image_url=image_url)
+        if not draft_data:
+            return None
+        return self.publish_draft(draft_data["id"])
+
+    async def acreate_draft(self, content, title, image_url=None):
+        """Async create_draft"""
+        import httpx
+
+        if not self._check_credentials():
+            return None
+
+        print("\nCreating draft...")
+        try:
+            data = await self._agraphql(
+                self.create_draft_query, {"input": self._draft_input(content, title, image_url)}, "createDraft"
+            )
+            return self._draft_result(data)
+        except httpx.HTTPError as e:
+            print(f"❌ Network or API error during Hashnode operation: {e}")
+            return None
+        except json.JSONDecodeError as e:
+            print(f"❌ JSON decode error during Hashnode operation: {e}")
+            return None
+
+    async def apublish_draft(self, draft_id):
+        """Async publish_draft"""
+        import httpx
+
+        if not self._check_credentials():
+            return None
+
+        print("\nPublishing draft...")
+        try:
+            data = await self._agraphql(self.publish_draft_query, {"input": {"draftId": draft_id}}, "publishDraft")
+            return self._publish_result(data)
+        except httpx.HTTPError as e:
+            print(f"❌ Network or API error during Hashnode operation: {e}")
+            return None
+        except json.JSONDecodeError as e:
+            print(f"❌ JSON decode error during Hashnode operation: {e}")
+            return None
+
+    async def aupdate_post_images(self, post_id, image_url):
+        """Async update_post_images"""
+        import httpx
+
+        if not self._check_credentials() or not image_url:
+            return None
+
+        print("\nUpdating post images...")
+        try:
+            data = await self._agraphql(
+                self.update_post_query, {"input": {"id": post_id, **self._image_options(image_url)}}, "updatePost",
+                idempotent=True,
+            )
+            return self._updated_post_result(data)
+        except httpx.HTTPError as e:
+            print(f"❌ Network or API error during Hashnode operation: {e}")
+            return None
+        except json.JSONDecodeError as e:
+            print(f"❌ JSON decode error during Hashnode operation: {e}")
+            return None
+
+    async def apublish_hash_node(self, content, title="The Ultimate Chewy Chocolate Chip Cookies", image_url=None):
+        """Async publish_hash_node"""
+        draft_data = await self.acreate_draft(content, title, image_url=image_url)
+        if not draft_data:
+            return None
+        return await self.apublish_draft(draft_data["id"])
+
+    def _create_drafts(self, posts):
+        """Create drafts for `posts` in one aliased request; returns (draft, error) tuples"""
+        print(f"\nCreating {len(posts)} drafts...")
+        inputs = [self._draft_input(p["content"], p["title"], p.get("image_url")) for p in posts]
+        try:
+            results = self._batched_mutation("createDraft", "CreateDraftInput", DRAFT_FIELDS, inputs, "createDrafts")
+            return [(value["draft"] if value else None, error) for value, error in results]
+        except BatchRejected as e:
+            print(f"⚠️ Batched createDraft rejected ({e}), creating drafts one by one")
+            return [
+                (draft, None if draft else "Failed to create draft")
+                for draft in (self.create_draft(p["content"], p["title"], image_url=p.get("image_url")) for p in posts)
+            ]
+        except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+            print(f"❌ Network or API error during Hashnode operation: {e}")
+            return [(None, str(e))] * len(posts)
+
+    def _publish_drafts(self, draft_ids):
+        """Publish drafts in one aliased request; returns (post, error) tuples"""
+        print(f"\nPublishing {len(draft_ids)} drafts...")
+        inputs = [{"draftId": draft_id} for draft_id in draft_ids]
+        try:
+            results = self._batched_mutation("publishDraft", "PublishDraftInput", POST_FIELDS, inputs, "publishDrafts")
+            return [(value["post"] if value else None, error) for value, error in results]
+        except BatchRejected as e:
+            print(f"⚠️ Batched publishDraft rejected ({e}), publishing drafts one by one")
+            return [
+                (post, None if post else "Failed to publish draft")
+                for post in (self.publish_draft(draft_id) for draft_id in draft_ids)
+            ]
+        except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+            print(f"❌ Network or API error during Hashnode operation: {e}")
+            return [(None, str(e))] * len(draft_ids)
+
+    def publish_many(self, posts, batch_size=None):
+        """
+        Publish many posts with batched GraphQL mutations.
+
+        `posts` is a list of {"title", "content", "image_url"} dicts. Drafts are
+        created HASHNODE_BATCH_SIZE (default 5) at a time in one aliased
+        createDraft request; each chunk is published with one aliased
+        publishDraft request while the next chunk's drafts are being created.
+        Requests go through the "hashnode" rate limit. A batch that Hashnode
+        rejects as a whole is retried one post at a time.
+
+        Returns a list in input order of {"title", "status" ("published" or
+        "failed"), "draft", "post", "error"} dicts.
+        """
+        results = [
+            {"title": p["title"], "status": "failed", "draft": None, "post": None, "error": None}
+            for p in posts
+        ]
+        if not posts:
+            return results
+        if not self._check_credentials():
+            for result in results:
+                result["error"] = "Missing Hashnode credentials"
+            return results
+
+        batch_size = max(1, batch_size or int(os.getenv("HASHNODE_BATCH_SIZE", "5")))
+
+        def publish_chunk(ready):
+            outcomes = self._publish_drafts([draft["id"] for _, draft in ready])
+            for (index, _), (post, error) in zip(ready, outcomes):
+                if post:
+                    results[index].update(status="published", post=post)
+                else:
+                    results[index]["error"] = error
+
+        with ThreadPoolExecutor(max_workers=1) as publishing:
+            pending = []
+            for start in range(0, len(posts), batch_size):
+                chunk = range(start, min(start + batch_size, len(posts)))
+                ready = []
+                for index, (draft, error) in zip(chunk, self._create_drafts([posts[i] for i in chunk])):
+                    if draft:
+                        results[index]["draft"] = draft
+                        ready.append((index, draft))
+                    else:
+                        results[index]["error"] = error
+                if ready:
+                    pending.append(publishing.submit(publish_chunk, ready))
+            for future in pending:
+                future.result()
+
+        published = sum(1 for result in results if result["status"] == "published")
+        print(f"\n🎉 Published {published}/{len(posts)} posts")
+        return results
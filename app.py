@@ -1,33 +1,84 @@
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, Response, jsonify, request, render_template
+import asyncio
 import os
-import requests
+import hashlib
 import json
-from datetime import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
 from http import HTTPStatus
 from dotenv import load_dotenv
-from prompts import new_blog_post_idea, blog_post_prompt, image_prompt
-from Notifiy import Publisher
-from utils.image_uploader import upload_image_to_r2
-from supabase import create_client, Client
+from prompts import (
+    IMAGE_NEGATIVE_PROMPT,
+    new_blog_post_idea,
+    blog_post_prompt,
+    idea_and_post_prompt,
+    image_prompt,
+    parse_idea_and_post,
+    prompt_size,
+)
+from utils.image_uploader import peek_stream, upload_image_to_r2, upload_stream_to_r2
+from utils import async_http, http_client, rate_limit
+from utils.pipeline import Pipeline, StageError
+from utils.cache import MemoryCache, get_cache
+from utils.jobs import COMPLETED, FAILED, READY, RUNNING, get_job_store
+from utils.pool import in_refill_window, missing_items, pool_size, refill_interval, refill_window
+from utils.image_processing import process_and_upload
+from utils.image_providers import afetch_first, endpoint_stats, fetch_first, ordered_endpoints, strategy_settings
+from utils.tracing import metrics_snapshot, otlp_spans, prometheus_text, recent_spans, span
+from utils.zai import StreamError, get_zai_client
+from utils.dedup import get_title_index
+from utils.singleflight import get_single_flight
+from utils.events import emit, get_event_log
+from utils.tasks import TaskStore, WriteBehind
 
 load_dotenv()
 
 app = Flask(__name__)
 
-# Supabase setup
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_ANON_KEY")
-supabase: Client = create_client(url, key)
+# Heavy clients (supabase, requests, boto3) are imported and built on first
+# use so cold starts that only render the dashboard don't pay for them.
+_supabase = None
+_supabase_lock = threading.Lock()
 
-def generate_food_image(idea, post):
+def get_supabase():
     """
-    Generate a food image based on `idea` and `post` text.
+    Returns the shared Supabase client, creating it on first use.
+    """
+    global _supabase
+    if _supabase is None:
+        with _supabase_lock:
+            if _supabase is None:
+                from supabase import create_client
+
+                url: str = os.environ.get("SUPABASE_URL")
+                key: str = os.environ.get("SUPABASE_ANON_KEY")
+                _supabase = create_client(url, key)
+    return _supabase
+
+def _task_changed(op, rows):
+    """
+    Sends written task rows to the dashboard's change feed (/api/events).
     """
+    emit("task", {"op": op, "rows": [{c: row[c] for c in POST_COLUMNS if c in row} for row in rows]})
+
+task_store = TaskStore(get_supabase, on_change=_task_changed)
+
+# Try both router and direct API endpoints
+IMAGE_API_URLS = [
+    "https://router.huggingface.co/hf-inference/models/stabilityai/stable-diffusion-3-medium-diffusers",
+    "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-3-medium-diffusers",
+    "https://router.huggingface.co/fal-ai/fal-ai/fast-sdxl"
+]
+
+def _hf_token():
     # Check if token is set
     try:
         HF_TOKEN = os.environ['HF_TOKEN']
         if not HF_TOKEN:
             raise ValueError("HF_TOKEN is empty")
+        return HF_TOKEN
     except KeyError:
         print("❌ Error: HF_TOKEN environment variable not set")
         print("Please set your Hugging Face token with: export HF_TOKEN=your_token_here")
@@ -36,223 +87,1412 @@ def generate_food_image(idea, post):
         print(f"❌ Error: {e}")
         return None
 
-    # Try both router and direct API endpoints
-    API_URLS = [
-        "https://router.huggingface.co/hf-inference/models/stabilityai/stable-diffusion-3-medium-diffusers",
-        "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-3-medium-diffusers",
-        "https://router.huggingface.co/fal-ai/fal-ai/fast-sdxl"
-    ]
-    
-    def query(payload, url):
-        headers = {
-            "Authorization": f"Bearer {HF_TOKEN}",
-            "Content-Type": "application/json"
-        }
-        print(f"Trying endpoint: {url}")
-        response = requests.post(url, headers=headers, json=payload)
-        
-        print(f"Response status: {response.status_code}")
-        
-        if response.status_code == 200:
-            return response.content
-        elif response.status_code == 401:
-            print("❌ Authentication failed. Check your token:")
-            print("1. Token is valid at https://huggingface.co/settings/tokens")
-            print("2. Token has 'read' permissions")
-            print("3. Token is correctly set as HF_TOKEN environment variable")
-            return None
-        elif response.status_code == 404:
-            print("❌ Model not found or temporarily unavailable")
-            return None
-        else:
-            print(f"❌ Error: {response.status_code} - {response.text[:200]}...")
-            return None
+def _hf_headers(hf_token):
+    return {
+        "Authorization": f"Bearer {hf_token}",
+        "Content-Type": "application/json"
+    }
 
+def _image_payload(idea, post):
     # Generate image prompt
-    prompt = image_prompt(idea, post)
-    print(f"Generated image prompt: {prompt}")
-    
-    # Try each endpoint until one works
-    image_bytes = None
-    for url in API_URLS:
-        payload = {
-            "inputs": prompt,
-            "options": {"wait_for_model": True}
-        }
-        image_bytes = query(payload, url)
-        
-        if image_bytes:
-            break
-    
-    if image_bytes:
-        file_name = f"{idea.replace(' ', '-').lower()}-{datetime.now().strftime('%Y%m%d%H%M%S')}.jpg"
-        image_url = upload_image_to_r2(image_bytes, file_name)
-        return image_url
+    with span("image.prompt") as s:
+        prompt = image_prompt(idea, post)
+        size = prompt_size(prompt)
+        s.set(prompt_chars=size["chars"], prompt_tokens=size["tokens"])
+    print(f"Generated image prompt (~{size['tokens']} tokens): {prompt}")
+
+    return {
+        "inputs": prompt,
+        "parameters": {"negative_prompt": IMAGE_NEGATIVE_PROMPT},
+        "options": {"wait_for_model": True}
+    }
+
+def _image_from_response(response, s):
+    """
+    Returns the image bytes of a successful endpoint response, or None.
+    """
+    print(f"Response status: {response.status_code}")
+    s.set(status_code=response.status_code, response_bytes=len(response.content))
+
+    if response.status_code == 200:
+        return response.content
+    s.fail(f"HTTP {response.status_code}")
+    if response.status_code == 401:
+        print("❌ Authentication failed. Check your token:")
+        print("1. Token is valid at https://huggingface.co/settings/tokens")
+        print("2. Token has 'read' permissions")
+        print("3. Token is correctly set as HF_TOKEN environment variable")
+    elif response.status_code == 404:
+        print("❌ Model not found or temporarily unavailable")
+    else:
+        print(f"❌ Error: {response.status_code} - {response.text[:200]}...")
     return None
 
-def generate_blog_post_idea():
-    zai_api_key = os.getenv("ZAI_API_KEY")
-    if not zai_api_key:
-        print("❌ Error: ZAI_API_KEY environment variable not set")
+def _store_image(image_bytes):
+    """
+    Uploads the processed WebP cover of the image (or the raw bytes if
+    processing fails) under a content-hash key and returns its URL.
+    """
+    return process_and_upload(image_bytes) or upload_image_to_r2(image_bytes)
+
+def generate_food_image(idea, post, fresh=False):
+    """
+    Generate a food image based on `idea` and `post` text.
+
+    The stored image URL for an identical prompt is served from the response
+    cache unless `fresh` is set. Only the URL is cached, never the
+    multi-megabyte image bytes.
+    """
+    HF_TOKEN = _hf_token()
+    if not HF_TOKEN:
         return None
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {zai_api_key}",
-    }
-    data = {
-        "model": "glm-4.5-flash",
-        "messages": new_blog_post_idea(),
-        "temperature": 0.7,
-        "top_p": 0.8,
-    }
+    import requests
 
-    try:
-        response = requests.post(
-            "https://api.z.ai/api/paas/v4/chat/completions",
-            headers=headers,
-            json=data
+    def query(payload, url):
+        print(f"Trying endpoint: {url}")
+        with span("image.generate", key=url.split("/", 3)[-1], endpoint=url) as s:
+            try:
+                response = http_client.post(url, provider="hf", headers=_hf_headers(HF_TOKEN), json=payload)
+            except requests.exceptions.RequestException as e:
+                print(f"❌ Request to {url} failed: {e}")
+                s.fail(e)
+                return None
+            return _image_from_response(response, s)
+
+    payload = _image_payload(idea, post)
+
+    # Start with the healthiest endpoint and hedge to the next ones
+    def generate():
+        endpoints = ordered_endpoints(IMAGE_API_URLS)
+        hedge_delay, max_parallel = strategy_settings(len(endpoints))
+        image_bytes = fetch_first(
+            endpoints,
+            lambda url: query(payload, url),
+            hedge_delay=hedge_delay,
+            max_parallel=max_parallel,
         )
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error generating blog post idea: {e}")
+        return _store_image(image_bytes) if image_bytes else None
+
+    return get_cache().get_or_set("image_url", payload, generate, bypass=fresh)
+
+async def agenerate_food_image(idea, post, fresh=False):
+    """
+    Async generate_food_image; image processing and the R2 upload run in a
+    worker thread.
+    """
+    HF_TOKEN = _hf_token()
+    if not HF_TOKEN:
         return None
-    except json.JSONDecodeError as e:
-        print(f"❌ Error decoding JSON: {e}")
+
+    import httpx
+
+    async def query(payload, url):
+        print(f"Trying endpoint: {url}")
+        with span("image.generate", key=url.split("/", 3)[-1], endpoint=url) as s:
+            try:
+                response = await async_http.post(url, provider="hf", headers=_hf_headers(HF_TOKEN), json=payload)
+            except httpx.HTTPError as e:
+                print(f"❌ Request to {url} failed: {e}")
+                s.fail(e)
+                return None
+            return _image_from_response(response, s)
+
+    payload = _image_payload(idea, post)
+
+    async def generate():
+        endpoints = ordered_endpoints(IMAGE_API_URLS)
+        hedge_delay, max_parallel = strategy_settings(len(endpoints))
+        image_bytes = await afetch_first(
+            endpoints,
+            lambda url: query(payload, url),
+            hedge_delay=hedge_delay,
+            max_parallel=max_parallel,
+        )
+        return await asyncio.to_thread(_store_image, image_bytes) if image_bytes else None
+
+    return await get_cache().aget_or_set("image_url", payload, generate, bypass=fresh)
+
+def generate_blog_post_idea(avoid=None):
+    zai = get_zai_client()
+    if zai is None:
         return None
+    return zai.complete(new_blog_post_idea(avoid), span_name="zai.idea")
 
-def generate_blog_post(idea):
+def generate_blog_post(idea, fresh=False):
+    """
+    Generate the Markdown post for `idea`, reusing a cached completion for the
+    same prompt and sampling params unless `fresh` is set.
+    """
     if not idea:
         print("❌ Cannot generate blog post: idea is missing")
         return None
 
-    zai_api_key = os.getenv("ZAI_API_KEY")
-    if not zai_api_key:
-        print("❌ Error: ZAI_API_KEY environment variable not set")
+    zai = get_zai_client()
+    if zai is None:
         return None
+    return zai.complete(blog_post_prompt(idea), span_name="zai.post", cache=True, fresh=fresh)
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {zai_api_key}",
-    }
-    data = {
-        "model": "glm-4.5-flash",
-        "messages": blog_post_prompt(idea),
-        "temperature": 0.7,
-        "top_p": 0.8,
-    }
+def generate_idea_and_post(fresh=False, avoid=None):
+    """
+    Generate the title and the Markdown post in a single structured (JSON)
+    completion, saving one round trip.
 
-    try:
-        response = requests.post(
-            "https://api.z.ai/api/paas/v4/chat/completions",
-            headers=headers,
-            json=data
-        )
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error generating blog post: {e}")
+    Falls back to the two-call path when the reply can't be parsed: with only
+    a usable title the post is generated for it, otherwise both are.
+
+    Returns:
+        tuple: (idea, post); either is None if generation failed.
+    """
+    zai = get_zai_client()
+    if zai is None:
+        return None, None
+
+    # Not cached: the prompt is the same on every call
+    reply = zai.complete(
+        idea_and_post_prompt(avoid),
+        span_name="zai.idea_and_post",
+        response_format={"type": "json_object"},
+    )
+    idea, post = parse_idea_and_post(reply)
+    if idea and post:
+        return idea, post
+
+    print("⚠️ Could not parse single-call reply, falling back to two calls")
+    idea = idea or generate_blog_post_idea(avoid)
+    return idea, generate_blog_post(idea, fresh=fresh)
+
+def load_stored_titles(page_size=1000):
+    """
+    Yields every stored post title, paging through the tasks table, after the
+    ideas of pooled and running jobs that have no row yet.
+    """
+    yield from get_job_store().ideas()
+    offset = 0
+    while True:
+        with span("supabase.select_titles", offset=offset):
+            rows = get_supabase().table('tasks').select("title").order("id").range(offset, offset + page_size - 1).execute().data
+        for row in rows:
+            if row.get("title"):
+                yield row["title"]
+        if len(rows) < page_size:
+            return
+        offset += page_size
+
+def generate_unique_idea(fresh=False, single=None):
+    """
+    Generates an idea that isn't a near-duplicate of an already stored title.
+
+    Duplicates are regenerated up to IDEA_MAX_ATTEMPTS times (default 3), each
+    time telling the model which titles to avoid. `single` picks the one-call
+    idea + post mode (defaults to GENERATION_MODE).
+
+    Returns:
+        tuple: (idea, post); post is only set in single-call mode. Both are
+        None if no new idea could be generated.
+    """
+    if single is None:
+        single = generation_mode() == "single"
+    index = get_title_index(load_stored_titles)
+    attempts = max(1, int(os.getenv("IDEA_MAX_ATTEMPTS", "3")))
+    avoid = []
+
+    for attempt in range(1, attempts + 1):
+        if single:
+            idea, post = generate_idea_and_post(fresh=fresh, avoid=avoid)
+        else:
+            idea, post = generate_blog_post_idea(avoid), None
+        if not idea:
+            return None, None
+        if not _is_duplicate(index, idea, avoid, attempt, attempts):
+            return idea, post
+
+    print(f"❌ Every generated idea duplicated an existing post after {attempts} attempts")
+    return None, None
+
+def _is_duplicate(index, idea, avoid, attempt, attempts):
+    """
+    Checks `idea` against the title index and reserves it when it is new, so
+    a concurrent run cannot accept the same title; a duplicate and its match
+    are added to the `avoid` list for the next attempt.
+    """
+    match = index.claim(idea)
+    if match is None:
+        return False
+    stored_title, similarity = match
+    print(f"♻️ Idea '{idea}' is too close to '{stored_title}' ({similarity}), regenerating ({attempt}/{attempts})")
+    avoid.extend(title for title in (idea, stored_title) if title not in avoid)
+    return True
+
+async def agenerate_blog_post_idea(avoid=None):
+    zai = get_zai_client()
+    if zai is None:
+        return None
+    return await zai.acomplete(new_blog_post_idea(avoid), span_name="zai.idea")
+
+async def agenerate_blog_post(idea, fresh=False):
+    """
+    Async generate_blog_post.
+    """
+    if not idea:
+        print("❌ Cannot generate blog post: idea is missing")
         return None
-    except json.JSONDecodeError as e:
-        print(f"❌ Error decoding JSON: {e}")
+
+    zai = get_zai_client()
+    if zai is None:
         return None
+    return await zai.acomplete(blog_post_prompt(idea), span_name="zai.post", cache=True, fresh=fresh)
+
+async def agenerate_idea_and_post(fresh=False, avoid=None):
+    """
+    Async generate_idea_and_post.
+    """
+    zai = get_zai_client()
+    if zai is None:
+        return None, None
+
+    reply = await zai.acomplete(
+        idea_and_post_prompt(avoid),
+        span_name="zai.idea_and_post",
+        response_format={"type": "json_object"},
+    )
+    idea, post = parse_idea_and_post(reply)
+    if idea and post:
+        return idea, post
+
+    print("⚠️ Could not parse single-call reply, falling back to two calls")
+    idea = idea or await agenerate_blog_post_idea(avoid)
+    return idea, await agenerate_blog_post(idea, fresh=fresh)
+
+async def agenerate_unique_idea(fresh=False, single=None):
+    """
+    Async generate_unique_idea; the title index is loaded in a worker thread.
+    """
+    if single is None:
+        single = generation_mode() == "single"
+    index = await asyncio.to_thread(get_title_index, load_stored_titles)
+    attempts = max(1, int(os.getenv("IDEA_MAX_ATTEMPTS", "3")))
+    avoid = []
+
+    for attempt in range(1, attempts + 1):
+        if single:
+            idea, post = await agenerate_idea_and_post(fresh=fresh, avoid=avoid)
+        else:
+            idea, post = await agenerate_blog_post_idea(avoid), None
+        if not idea:
+            return None, None
+        if not _is_duplicate(index, idea, avoid, attempt, attempts):
+            return idea, post
+
+    print(f"❌ Every generated idea duplicated an existing post after {attempts} attempts")
+    return None, None
+
+def generation_mode():
+    """
+    ``single`` (one JSON completion for idea + post) or ``two_call`` (default).
+    """
+    mode = os.getenv("GENERATION_MODE", "two_call").lower()
+    return mode if mode in ("single", "two_call") else "two_call"
+
+def stream_blog_post(idea):
+    """
+    Streams the blog post for `idea` from the chat-completions API.
+
+    Yields content chunks as they arrive (SSE ``stream: true``). Yields
+    nothing if the client is not configured; raises StreamError if the
+    stream fails or is cut short.
+    """
+    if not idea:
+        print("❌ Cannot generate blog post: idea is missing")
+        return
+
+    zai = get_zai_client()
+    if zai is None:
+        return
+    yield from zai.stream(blog_post_prompt(idea))
 
 @app.route("/")
 def home():
     return render_template("index.html")
 
+POST_COLUMNS = ("id", "title", "image_url", "post_url", "created_at")
+DEFAULT_POST_COLUMNS = ("id", "title", "image_url", "post_url")
+MAX_POSTS_PAGE_SIZE = 100
+
+# Short-lived cache of /api/posts pages, cleared whenever a task row changes.
+posts_cache = MemoryCache(maxsize=64, ttl=float(os.getenv("POSTS_CACHE_TTL", "15")))
+
+def invalidate_posts_cache():
+    posts_cache.clear()
+
+def _posts_page(columns, limit, cursor):
+    """
+    Returns ``(body, etag)`` for one page of tasks, newest first.
+    """
+    cache_key = (columns, limit, cursor)
+    cached = posts_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    query = get_supabase().table('tasks').select(",".join(columns)).order("id", desc=True).limit(limit + 1)
+    if cursor is not None:
+        query = query.lt("id", cursor)
+    with span("supabase.select", limit=limit) as s:
+        rows = query.execute().data
+        s.set(rows=len(rows))
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    body = json.dumps({
+        "data": rows,
+        "next_cursor": rows[-1]["id"] if has_more and rows else None
+    }, sort_keys=True)
+    page = (body, hashlib.sha256(body.encode("utf-8")).hexdigest()[:32])
+    posts_cache.set(cache_key, page)
+    return page
+
 @app.route("/api/posts", methods=["GET"])
 def get_posts():
+    """
+    Lists tasks newest first.
+
+    Query params: ``limit`` (default 20, max 100), ``cursor`` (the
+    ``next_cursor`` of the previous page) and ``columns`` (comma separated
+    subset of POST_COLUMNS). Supports ``If-None-Match`` and answers 304 when
+    the page has not changed.
+    """
     try:
-        data, count = supabase.table('tasks').select('*').execute()
-        return jsonify(data)
+        limit = min(max(int(request.args.get("limit", 20)), 1), MAX_POSTS_PAGE_SIZE)
+        cursor = request.args.get("cursor")
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "limit and cursor must be integers"}), HTTPStatus.BAD_REQUEST
+
+    requested = request.args.get("columns")
+    columns = tuple(c.strip() for c in requested.split(",") if c.strip()) if requested else DEFAULT_POST_COLUMNS
+    unknown = [c for c in columns if c not in POST_COLUMNS]
+    if unknown:
+        return jsonify({"error": f"Unknown columns: {', '.join(unknown)}"}), HTTPStatus.BAD_REQUEST
+    if "id" not in columns:
+        columns = ("id",) + columns
+
+    try:
+        body, etag = _posts_page(columns, limit, cursor)
     except Exception as e:
         return jsonify({"error": str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
 
-@app.route("/api/scheduled-call", methods=["GET"])
-def scheduled_call():
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+DEFAULT_IMAGE_URL = "https://cdn.image.sniplyx.xyz/uploaded-image-20250813104033.jpg"
+
+
+def update_post_url(task_id, post_url):
+    """
+    Stores the published URL on the row with primary key `task_id`.
+    """
     try:
-        # Generate idea
-        idea = generate_blog_post_idea()
-        if not idea:
-            return jsonify({
-                "error": "Failed to generate blog post idea"
-            }), HTTPStatus.INTERNAL_SERVER_ERROR
+        if post_url:
+            task_store.update(task_id, {"post_url": post_url})
+            invalidate_posts_cache()
+    except Exception as e:
+        print(f"❌ Error updating post_url in Supabase: {e}")
 
+def insert_post_row(idea, image, post_url=None):
+    """
+    Inserts the post's row, adds its title to the dedup index and returns the
+    row id.
+    """
+    row = {"title": idea, "image_url": image}
+    if post_url:
+        row["post_url"] = post_url
+    try:
+        task_id = task_store.insert(row)
+        invalidate_posts_cache()
+        get_title_index().add(idea)
+        return task_id
+    except Exception as e:
+        print(f"❌ Error saving to Supabase: {e}")
+        raise StageError(f"Failed to save to Supabase: {str(e)}")
+
+def coalesce_task_writes():
+    """
+    True (default) to write a published post's row once, post_url included,
+    instead of inserting it before publishing and updating it afterwards.
+    """
+    return os.getenv("TASK_COALESCE_WRITES", "true").lower() != "false"
+
+def build_post_pipeline(publisher=None, image_future=None, fresh=False, publish=True, asynchronous=False, writer=None,
+                        prepare=False, job_id=None):
+    """
+    Builds the idea -> post -> image/draft -> insert -> publish dependency graph.
+
+    Image generation (the slowest stage) runs concurrently with Hashnode draft
+    creation; the cover stage attaches the image to the post right after
+    publishing, so a failed attach is retried on its own when resumed.
+    If `image_future` is given, the image stage waits on it instead of
+    generating a new image. `fresh` bypasses the response cache.
+
+    With GENERATION_MODE=single the idea stage also produces the post in the
+    same completion, and the post stage just hands it on. With `publish` off
+    the graph stops after the insert, for callers that publish in bulk.
+    With `asynchronous` the Z.ai, Hugging Face and Hashnode stages are
+    coroutines for ``Pipeline.arun``.
+
+    The row is written by primary key. When publishing, the insert is
+    deferred and the row is written once with its post_url (see
+    coalesce_task_writes); a post whose publish fails then has no row until
+    its job is resumed. With a `writer` (WriteBehind) the row is buffered
+    under `job_id` and written in bulk with the rest of the batch.
+
+    With `prepare` the graph stops after creating a draft that already has
+    the cover image, for the pre-generation pool; publishing such a job later
+    only runs the insert, publish and post_url stages (cover is a no-op).
+    """
+    from Notifiy import Publisher
+
+    publisher = publisher or Publisher()
+    single_call_posts = {}
+
+    def checked_idea(idea, post_content):
+        if idea and post_content:
+            single_call_posts[idea] = post_content
+        if not idea:
+            raise StageError("Failed to generate a new blog post idea")
         print(f"Generated blog post idea: {idea}")
+        return idea
 
-        # Generate blog post
-        post_content = generate_blog_post(idea)
+    def checked_post(post_content):
         if not post_content:
-            return jsonify({
-                "error": "Failed to generate blog post content"
-            }), HTTPStatus.INTERNAL_SERVER_ERROR
-
+            raise StageError("Failed to generate blog post content")
         print("Generated blog post:")
         print(post_content)
+        return post_content
 
-        # Generate and upload image
-        image_url = generate_food_image(idea, post_content)
+    def checked_image(image_url):
         if not image_url:
             print("⚠️ Could not generate image. Using a default.")
-            image_url = "https://cdn.image.sniplyx.xyz/uploaded-image-20250813104033.jpg"
+            image_url = DEFAULT_IMAGE_URL
+        return image_url
 
-        # Save to Supabase
-        try:
-            data, count = supabase.table('tasks').insert({
-                "title": idea,
-                "image_url": image_url
-            }).execute()
-        except Exception as e:
-            print(f"❌ Error saving to Supabase: {e}")
-            return jsonify({"error": f"Failed to save to Supabase: {str(e)}"}), HTTPStatus.INTERNAL_SERVER_ERROR
+    def checked_draft(draft):
+        if not draft:
+            raise StageError("Failed to publish blog post")
+        return draft
 
-        # Publish blog post
-        publisher = Publisher()
-        result = publisher.publish_hash_node(
-            content=post_content,
-            title=idea,
-            image_url=image_url,
-        )
+    def checked_publish(result):
+        if not result:
+            raise StageError("Failed to publish blog post")
+        print("\n🎉 Blog post published successfully!")
+        return result
 
-        if result:
-            print("\n🎉 Blog post published successfully!")
-            # Update post_url in Supabase
-            try:
-                post_url = result.get('url') # Assuming the result from publish_hash_node contains the URL
-                if post_url:
-                    supabase.table('tasks').update({"post_url": post_url}).eq("title", idea).execute()
-            except Exception as e:
-                print(f"❌ Error updating post_url in Supabase: {e}")
+    def checked_cover(updated):
+        if not updated:
+            raise StageError("Failed to attach the cover image to the published post")
+        return True
 
-            return jsonify({
-                "message": "Blog post published successfully!",
-                "data": result
-            }), HTTPStatus.OK
+    if asynchronous:
+        async def idea_stage():
+            return checked_idea(*await agenerate_unique_idea(fresh=fresh))
+
+        async def post_stage(idea):
+            return checked_post(single_call_posts.pop(idea, None) or await agenerate_blog_post(idea, fresh=fresh))
+
+        async def image_stage(idea, post):
+            return checked_image(await agenerate_food_image(idea, post, fresh=fresh))
+
+        async def draft_stage(idea, post):
+            return checked_draft(await publisher.acreate_draft(content=post, title=idea))
+
+        async def prepared_draft_stage(idea, post, image):
+            get_title_index().add(idea)
+            draft = checked_draft(await publisher.acreate_draft(content=post, title=idea, image_url=image))
+            return {**draft, "cover_image": image}
+
+        async def publish_stage(draft, image, insert):
+            return checked_publish(await publisher.apublish_draft(draft["id"]))
+
+        async def cover_stage(draft, image, publish):
+            if draft.get("cover_image") == image:
+                return True
+            return checked_cover(await publisher.aupdate_post_images(publish["id"], image))
+    else:
+        def idea_stage():
+            return checked_idea(*generate_unique_idea(fresh=fresh))
+
+        def post_stage(idea):
+            return checked_post(single_call_posts.pop(idea, None) or generate_blog_post(idea, fresh=fresh))
+
+        def image_stage(idea, post):
+            if image_future is not None:
+                return checked_image(image_future.result())
+            return checked_image(generate_food_image(idea, post, fresh=fresh))
+
+        def draft_stage(idea, post):
+            return checked_draft(publisher.create_draft(content=post, title=idea))
+
+        def prepared_draft_stage(idea, post, image):
+            get_title_index().add(idea)
+            draft = checked_draft(publisher.create_draft(content=post, title=idea, image_url=image))
+            return {**draft, "cover_image": image}
+
+        def publish_stage(draft, image, insert):
+            return checked_publish(publisher.publish_draft(draft["id"]))
+
+        def cover_stage(draft, image, publish):
+            if draft.get("cover_image") == image:
+                return True
+            return checked_cover(publisher.update_post_images(publish["id"], image))
+
+    # Supabase calls stay synchronous; arun runs them in a worker thread
+    deferred = writer is None and publish and coalesce_task_writes()
+
+    def insert_stage(idea, image):
+        if writer is None and not deferred:
+            return {"id": insert_post_row(idea, image)}
+        if writer is not None:
+            writer.put(job_id or idea, {"title": idea, "image_url": image})
+        # Reserve the title now; the row itself is written later
+        get_title_index().add(idea)
+        return {"id": None, "deferred": writer is None}
+
+    def post_url_stage(idea, image, insert, publish):
+        post_url = publish.get('url')
+        if writer is not None:
+            writer.put(job_id or idea, {"post_url": post_url})
+            return True
+        # Older checkpoints stored True instead of the row id
+        insert = insert if isinstance(insert, dict) else {"id": None}
+        if insert.get("deferred"):
+            insert_post_row(idea, image, post_url)
+            return True
+        # A batch writer stores rows without checkpointing their ids
+        task_id = insert["id"] or task_store.id_for_title(idea)
+        if task_id is None:
+            insert_post_row(idea, image, post_url)
+        else:
+            update_post_url(task_id, post_url)
+        return True
+
+    pipeline = (
+        Pipeline(max_workers=3)
+        .add("idea", idea_stage, provider="zai")
+        .add("post", post_stage, deps=("idea",), provider="zai")
+        .add("image", image_stage, deps=("idea", "post"), provider="hf")
+    )
+    if prepare:
+        pipeline.add("draft", prepared_draft_stage, deps=("idea", "post", "image"), provider="hashnode")
+        return pipeline
 
+    pipeline.add("insert", insert_stage, deps=("idea", "image"))
+    if publish:
+        pipeline.add("draft", draft_stage, deps=("idea", "post"), provider="hashnode")
+        pipeline.add("publish", publish_stage, deps=("draft", "image", "insert"), provider="hashnode")
+        pipeline.add("cover", cover_stage, deps=("draft", "image", "publish"), provider="hashnode")
+        pipeline.add("post_url", post_url_stage, deps=("idea", "image", "insert", "publish"))
+    return pipeline
+
+
+def _fresh_requested(body=None):
+    """
+    True when the caller asked to bypass the response cache (``?fresh=1``).
+    """
+    value = (body or {}).get("fresh", request.args.get("fresh", ""))
+    return str(value).lower() in ("1", "true", "yes")
+
+def _pipeline_error(outcome):
+    if not isinstance(outcome.error, StageError):
+        raise outcome.error
+    return str(outcome.error)
+
+
+def _start_job(job, fresh, on_stage=None):
+    """
+    Creates a new job, or starts another attempt of `job`. Returns
+    ``(store, job, fresh, checkpoint)``; `on_stage` is called after every
+    checkpoint.
+    """
+    store = get_job_store()
+    if job is None:
+        job = store.create(options={"fresh": fresh})
+    else:
+        fresh = fresh or job["options"].get("fresh", False)
+        if job["status"] != RUNNING:
+            store.start_attempt(job["id"])
+    if job["artifacts"]:
+        print(f"🔁 Resuming job {job['id']} from state '{job['state']}'")
+        if job["artifacts"].get("idea"):
+            # Reserve the title again in case a failed attempt released it
+            get_title_index().add(job["artifacts"]["idea"])
+    emit("job", {"id": job["id"], "status": RUNNING, "state": job["state"]})
+
+    def checkpoint(stage, timing, value):
+        if timing["status"] == "ok":
+            store.save_artifact(job["id"], stage, value)
+        event = {"job_id": job["id"], "stage": stage, **timing}
+        if stage == "idea" and timing["status"] == "ok":
+            event["title"] = value
+        emit("stage", event)
+        if on_stage is not None:
+            on_stage(stage, timing, value)
+
+    return store, job, fresh, checkpoint
+
+def _release_idea(results):
+    """
+    Gives back the title a failed run claimed in the dedup index, unless its
+    row was already written.
+    """
+    if results.get("idea") and "insert" not in results:
+        get_title_index().release(results["idea"])
+
+def _finish_job(store, job, outcome, publish, prepare=False):
+    if not outcome.ok:
+        _release_idea(outcome.results)
+        store.finish(job["id"], FAILED, str(outcome.error))
+    elif prepare:
+        store.finish(job["id"], READY)
+    elif publish:
+        store.finish(job["id"], COMPLETED)
+    return store.get(job["id"]), outcome
+
+def run_post_job(job=None, publisher=None, fresh=False, publish=True, writer=None, prepare=False, on_stage=None):
+    """
+    Runs a new post job, or resumes `job` from its last checkpoint.
+
+    Every stage result is persisted as soon as it completes, so a failed run
+    can be retried without redoing the finished stages. Returns
+    ``(job, outcome)`` with the job as stored after the run. With `publish`
+    off a successful job is left running for the caller to publish and finish.
+    `writer` buffers the row writes and `prepare` leaves a successful job
+    ready in the pre-generation pool (see build_post_pipeline). `on_stage`
+    is called after each stage, e.g. to renew a single-flight lease.
+    """
+    store, job, fresh, checkpoint = _start_job(job, fresh, on_stage)
+    try:
+        with span("pipeline", job_id=job["id"], resumed_from=job["state"]) as s:
+            pipeline = build_post_pipeline(publisher, fresh=fresh, publish=publish, writer=writer, prepare=prepare,
+                                           job_id=job["id"])
+            outcome = pipeline.run(job["artifacts"], on_stage=checkpoint)
+            if not outcome.ok:
+                s.fail(outcome.error)
+    except Exception as e:
+        store.finish(job["id"], FAILED, str(e))
+        raise
+    return _finish_job(store, job, outcome, publish, prepare)
+
+async def arun_post_job(job=None, publisher=None, fresh=False, publish=True, writer=None, on_stage=None):
+    """
+    Async run_post_job on the current event loop.
+    """
+    store, job, fresh, checkpoint = _start_job(job, fresh, on_stage)
+    try:
+        with span("pipeline", job_id=job["id"], resumed_from=job["state"]) as s:
+            pipeline = build_post_pipeline(publisher, fresh=fresh, publish=publish, asynchronous=True, writer=writer,
+                                           job_id=job["id"])
+            outcome = await pipeline.arun(job["artifacts"], on_stage=checkpoint)
+            if not outcome.ok:
+                s.fail(outcome.error)
+    except Exception as e:
+        store.finish(job["id"], FAILED, str(e))
+        raise
+    return _finish_job(store, job, outcome, publish)
+
+def _job_summary(job):
+    return {"id": job["id"], "status": job["status"], "state": job["state"], "attempts": job["attempts"]}
+
+def _enqueue_job(fresh=False):
+    job = get_job_store().enqueue(options={"fresh": fresh})
+    return jsonify({
+        "message": "Job queued",
+        "job": _job_summary(job),
+        "status_url": f"/api/jobs/{job['id']}"
+    }), HTTPStatus.ACCEPTED
+
+@app.route("/api/jobs", methods=["POST"])
+def enqueue_job():
+    """
+    Queues a post generation job for the worker and returns its id right away.
+    """
+    body = request.get_json(silent=True) or {}
+    return _enqueue_job(fresh=_fresh_requested(body))
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = get_job_store().get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), HTTPStatus.NOT_FOUND
+    return jsonify({
+        **_job_summary(job),
+        "title": job["artifacts"].get("idea"),
+        "image_url": job["artifacts"].get("image"),
+        "data": job["artifacts"].get("publish"),
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }), HTTPStatus.OK
+
+_refill_lock = threading.Lock()
+
+def pool_stats():
+    window = refill_window()
+    return {
+        "ready": get_job_store().count(READY),
+        "target": pool_size(),
+        "refill_window": f"{window[0]}-{window[1]}" if window else None,
+        "in_refill_window": in_refill_window(),
+        "refill_interval_s": refill_interval(),
+    }
+
+def refill_pool(max_items=1, force=False):
+    """
+    Pre-generates up to `max_items` pool items, back to back, while fewer
+    than POOL_SIZE are ready. Pacing is left to the caller (the worker waits
+    POOL_REFILL_INTERVAL between calls, or a cron hits /api/pool/refill).
+    Outside POOL_REFILL_WINDOW nothing is generated unless `force` is set,
+    and only one refill runs at a time in a process.
+
+    Returns:
+        list: the jobs generated by this call
+    """
+    if not force and not in_refill_window():
+        return []
+    if not _refill_lock.acquire(blocking=False):
+        print("⏳ A pool refill is already running")
+        return []
+
+    from Notifiy import Publisher
+
+    store = get_job_store()
+    publisher = Publisher()
+    generated = []
+    try:
+        while missing_items(store.count(READY)) and len(generated) < max_items:
+            job, outcome = run_post_job(publisher=publisher, prepare=True)
+            generated.append(job)
+            if not outcome.ok:
+                print(f"❌ Pool item failed at '{outcome.failed_stage}': {outcome.error}")
+                break
+            print(f"📦 Pool item ready: {job['artifacts'].get('idea')}")
+    finally:
+        _refill_lock.release()
+    return generated
+
+@app.route("/api/pool", methods=["GET"])
+def get_pool():
+    return jsonify(pool_stats()), HTTPStatus.OK
+
+@app.route("/api/pool/refill", methods=["POST"])
+def pool_refill():
+    """
+    Pre-generates one pool item, e.g. from an off-peak cron; call it again
+    for more so no request outlives a serverless time limit. ``force``
+    ignores POOL_REFILL_WINDOW.
+    """
+    body = request.get_json(silent=True) or {}
+    force = str(body.get("force", request.args.get("force", ""))).lower() in ("1", "true", "yes")
+
+    try:
+        generated = refill_pool(max_items=1, force=force)
+    except Exception as e:
+        print(f"❌ Unexpected error during pool refill: {e}")
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+    return jsonify({
+        "generated": [{**_job_summary(job), "title": job["artifacts"].get("idea")} for job in generated],
+        "pool": pool_stats()
+    }), HTTPStatus.OK
+
+def _enqueue_requested():
+    enqueue = request.args.get("enqueue", "").lower() in ("1", "true", "yes")
+    return enqueue or os.getenv("SCHEDULED_CALL_MODE", "").lower() == "queue"
+
+def _scheduled_job():
+    """
+    Picks or creates the job /api/scheduled-call should run. Returns
+    ``(job, response)``; when `response` is set it is returned as is (not
+    found, done).
+    """
+    store = get_job_store()
+    job_id = request.args.get("job_id")
+    if job_id:
+        job = store.get(job_id)
+        if job is None:
+            return None, (jsonify({"error": f"Job {job_id} not found"}), HTTPStatus.NOT_FOUND)
+        if job["status"] == COMPLETED:
+            return None, (jsonify({
+                "message": "Job already completed",
+                "data": job["artifacts"].get("publish"),
+                "job": _job_summary(job)
+            }), HTTPStatus.OK)
+        return job, None
+    if os.getenv("JOB_AUTO_RESUME", "true").lower() != "false":
+        job = store.claim_failed(int(os.getenv("JOB_MAX_ATTEMPTS", "3")))
+        if job is not None:
+            return job, None
+    # Publish the oldest pre-generated item; generate live when the pool is empty
+    job = store.claim_ready()
+    if job is not None:
+        print(f"📦 Publishing pre-generated post '{job['artifacts'].get('idea')}'")
+        return job, None
+    return store.create(options={"fresh": _fresh_requested()}), None
+
+def _claim_scheduled_run():
+    """
+    Single-flight check of a scheduled trigger (see utils/singleflight.py).
+    Returns ``(action, lease)`` from SingleFlight.claim.
+    """
+    action, lease = get_single_flight().claim(job_id=request.args.get("job_id"))
+    if action == "attach":
+        print(f"🔗 Run already in flight on {lease['name']}, waiting for its result")
+    elif action == "busy":
+        print("⏳ Every pipeline slot is busy, rejecting the trigger")
+    return action, lease
+
+def _start_scheduled_run(lease):
+    """
+    Picks the job of a claimed run and records it on `lease`, so triggers
+    attaching to the run can read its result. Returns ``(job, response)``.
+    """
+    job, response = _scheduled_job()
+    if response is None:
+        lease.set_job(job["id"])
+    return job, response
+
+def _busy_response():
+    return jsonify({
+        "error": "Too many pipelines are running, try again later"
+    }), HTTPStatus.TOO_MANY_REQUESTS, {"Retry-After": "60"}
+
+def _coalesced_result(job_id):
+    """
+    Returns ``(body, status)`` for a trigger attached to the run of `job_id`.
+    """
+    job = get_job_store().get(job_id) if job_id else None
+    if job is None:
+        return {"error": "The in-flight run ended without a job", "coalesced": True}, HTTPStatus.INTERNAL_SERVER_ERROR
+    body = {"job": _job_summary(job), "coalesced": True}
+    if job["status"] == COMPLETED:
+        return {
+            "message": "Blog post published successfully!",
+            "data": job["artifacts"].get("publish"),
+            **body
+        }, HTTPStatus.OK
+    return {
+        "error": job["error"] or f"The in-flight run stopped in state '{job['state']}'",
+        **body
+    }, HTTPStatus.INTERNAL_SERVER_ERROR
+
+def _scheduled_response(job, outcome):
+    if outcome.ok:
         return jsonify({
-            "error": "Failed to publish blog post"
+            "message": "Blog post published successfully!",
+            "data": outcome.results["publish"],
+            "job": _job_summary(job),
+            "timings": outcome.timings_report()
+        }), HTTPStatus.OK
+
+    return jsonify({
+        "error": _pipeline_error(outcome),
+        "job": _job_summary(job),
+        "timings": outcome.timings_report()
+    }), HTTPStatus.INTERNAL_SERVER_ERROR
+
+@app.route("/api/scheduled-call", methods=["GET"])
+def scheduled_call():
+    """
+    Generates and publishes one post. Resumes the job given by ``?job_id=``,
+    otherwise the latest failed job (unless JOB_AUTO_RESUME=false), otherwise
+    publishes the oldest pre-generated pool item, otherwise starts a new one.
+
+    With ``?enqueue=1`` (or SCHEDULED_CALL_MODE=queue) the job is only queued
+    for the worker and the call returns immediately.
+
+    Overlapping triggers are single-flighted: a call made while a recent run
+    is in flight waits for that run and returns its result (``"coalesced":
+    true``), and a call finding every PIPELINE_MAX_CONCURRENT slot busy
+    without a run to attach to gets 429.
+    """
+    if _enqueue_requested():
+        return _enqueue_job(fresh=_fresh_requested())
+
+    lease = None
+    try:
+        action, claimed = _claim_scheduled_run()
+        if action == "busy":
+            return _busy_response()
+        if action == "attach":
+            body, status = _coalesced_result(get_single_flight().join(claimed))
+            return jsonify(body), status
+
+        lease = claimed
+        job, response = _start_scheduled_run(lease)
+        if response is not None:
+            return response
+        return _scheduled_response(*run_post_job(job, fresh=_fresh_requested(), on_stage=lease.renew))
+
+    except Exception as e:
+        print(f"❌ Unexpected error: {e}")
+        return jsonify({
+            "error": f"An unexpected error occurred: {str(e)}"
         }), HTTPStatus.INTERNAL_SERVER_ERROR
+    finally:
+        if lease is not None:
+            lease.release()
+
+@app.route("/api/async/scheduled-call", methods=["GET"])
+async def ascheduled_call():
+    """
+    /api/scheduled-call on asyncio: the upstream calls are awaited on the
+    shared httpx client instead of blocking a worker thread each.
+    """
+    if _enqueue_requested():
+        return _enqueue_job(fresh=_fresh_requested())
+
+    lease = None
+    try:
+        action, claimed = _claim_scheduled_run()
+        if action == "busy":
+            return _busy_response()
+        if action == "attach":
+            body, status = _coalesced_result(await get_single_flight().ajoin(claimed))
+            return jsonify(body), status
+
+        lease = claimed
+        job, response = _start_scheduled_run(lease)
+        if response is not None:
+            return response
+        return _scheduled_response(*await arun_post_job(job, fresh=_fresh_requested(), on_stage=lease.renew))
 
     except Exception as e:
         print(f"❌ Unexpected error: {e}")
         return jsonify({
             "error": f"An unexpected error occurred: {str(e)}"
         }), HTTPStatus.INTERNAL_SERVER_ERROR
+    finally:
+        if lease is not None:
+            lease.release()
+        await async_http.aclose()
+
+def _batch_item(index, job, outcome):
+    item = {
+        "index": index,
+        "title": outcome.results.get("idea"),
+        "job": _job_summary(job),
+        "timings": outcome.timings_report(),
+    }
+    if outcome.ok:
+        item["status"] = "generated"
+    else:
+        item.update(status="failed", failed_stage=outcome.failed_stage, error=_pipeline_error(outcome))
+    return item
+
+def _run_batch_item(index, publisher, writer, fresh=False):
+    """
+    Generates and stores one batch post and buffers its row in `writer`;
+    publishing is left to `_publish_batch`. Returns ``(item, job, outcome)``,
+    job and outcome being None after an unexpected error.
+    """
+    try:
+        job, outcome = run_post_job(publisher=publisher, fresh=fresh, publish=False, writer=writer)
+        return _batch_item(index, job, outcome), job, outcome
+    except Exception as e:
+        print(f"❌ Unexpected error in batch item {index}: {e}")
+        return {"index": index, "status": "failed", "error": f"An unexpected error occurred: {str(e)}"}, None, None
+
+async def _arun_batch_item(index, publisher, writer, fresh, slots):
+    """
+    Async _run_batch_item; `slots` bounds how many pipelines run at once.
+    """
+    async with slots:
+        try:
+            job, outcome = await arun_post_job(publisher=publisher, fresh=fresh, publish=False, writer=writer)
+            return _batch_item(index, job, outcome), job, outcome
+        except Exception as e:
+            print(f"❌ Unexpected error in batch item {index}: {e}")
+            return {"index": index, "status": "failed", "error": f"An unexpected error occurred: {str(e)}"}, None, None
+
+def _publish_batch(publisher, generated, writer):
+    """
+    Publishes every generated batch post with one bulk Hashnode call, then
+    checkpoints and finishes their jobs and buffers the post URLs in
+    `writer`. A job whose publish failed keeps its draft, so resuming it only
+    retries publishDraft.
+    """
+    posts = [
+        {"title": outcome.results["idea"], "content": outcome.results["post"], "image_url": outcome.results["image"]}
+        for _, _, outcome in generated
+    ]
+    with span("hashnode.publish_many", posts=len(posts)):
+        published = publisher.publish_many(posts)
+
+    store = get_job_store()
+    for (item, job, _), result in zip(generated, published):
+        if result["draft"]:
+            store.save_artifact(job["id"], "draft", result["draft"])
+        if result["status"] == "published":
+            store.save_artifact(job["id"], "publish", result["post"])
+            writer.put(job["id"], {"post_url": result["post"].get("url")})
+            store.finish(job["id"], COMPLETED)
+            item.update(status="published", data=result["post"])
+        else:
+            error = result["error"] or "Failed to publish blog post"
+            store.finish(job["id"], FAILED, error)
+            item.update(status="failed", failed_stage="publish", error=error)
+        item["job"] = _job_summary(store.get(job["id"]))
+
+def _batch_params(body):
+    """
+    Returns ``(count, concurrency, error response)`` for a batch request.
+    """
+    max_count = int(os.getenv("BATCH_MAX_COUNT", "10"))
+    try:
+        count = int(body.get("count", request.args.get("count", 1)))
+        concurrency = int(body.get("concurrency", request.args.get("concurrency", 2)))
+    except (TypeError, ValueError):
+        return None, None, (jsonify({"error": "count and concurrency must be integers"}), HTTPStatus.BAD_REQUEST)
+
+    if not 1 <= count <= max_count:
+        return None, None, (jsonify({"error": f"count must be between 1 and {max_count}"}), HTTPStatus.BAD_REQUEST)
+    return count, max(1, min(concurrency, count)), None
+
+def _batch_writer():
+    return WriteBehind(task_store, on_flush=invalidate_posts_cache)
+
+def _batch_response(runs, count, started, writer):
+    items = [item for item, _, _ in runs]
+    succeeded = sum(1 for item in items if item["status"] == "published")
+    if succeeded == count:
+        status = HTTPStatus.OK
+    elif succeeded:
+        status = HTTPStatus.MULTI_STATUS
+    else:
+        status = HTTPStatus.INTERNAL_SERVER_ERROR
+
+    body = {
+        "requested": count,
+        "succeeded": succeeded,
+        "failed": count - succeeded,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        "results": items
+    }
+    if not writer.close():
+        body["storage_errors"] = writer.errors
+    return jsonify(body), status
+
+def _fail_batch(runs, writer, error):
+    """
+    Handles an unexpected batch error: fails the jobs still running, writes
+    the rows buffered so far and returns the error response.
+    """
+    print(f"❌ Unexpected error: {error}")
+    store = get_job_store()
+    for _, job, _ in runs:
+        if job is not None and store.get(job["id"])["status"] == RUNNING:
+            store.finish(job["id"], FAILED, str(error))
+    if writer is not None:
+        writer.close()
+    return jsonify({
+        "error": f"An unexpected error occurred: {str(error)}"
+    }), HTTPStatus.INTERNAL_SERVER_ERROR
+
+@app.route("/api/scheduled-call/batch", methods=["POST"])
+def scheduled_call_batch():
+    """
+    Generates and publishes `count` posts in one invocation, running up to
+    `concurrency` pipelines at once. Provider calls are further bounded by
+    the per-provider limits (ZAI_MAX_CONCURRENCY, HF_MAX_CONCURRENCY, ...).
+    The generated posts are then published together with batched Hashnode
+    mutations (see ``Publisher.publish_many``).
+    """
+    body = request.get_json(silent=True) or {}
+    count, concurrency, error = _batch_params(body)
+    if error is not None:
+        return error
+
+    from Notifiy import Publisher
+
+    fresh = _fresh_requested(body)
+    started = time.perf_counter()
+    runs, writer = [], None
+    try:
+        publisher = Publisher()
+        writer = _batch_writer()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            runs = list(executor.map(lambda index: _run_batch_item(index, publisher, writer, fresh), range(count)))
+
+        generated = [run for run in runs if run[0]["status"] == "generated"]
+        if generated:
+            _publish_batch(publisher, generated, writer)
+        return _batch_response(runs, count, started, writer)
+
+    except Exception as e:
+        return _fail_batch(runs, writer, e)
+
+@app.route("/api/async/scheduled-call/batch", methods=["POST"])
+async def ascheduled_call_batch():
+    """
+    /api/scheduled-call/batch on asyncio: `concurrency` pipelines run as tasks
+    on one event loop rather than one thread each.
+    """
+    body = request.get_json(silent=True) or {}
+    count, concurrency, error = _batch_params(body)
+    if error is not None:
+        return error
+
+    from Notifiy import Publisher
+
+    fresh = _fresh_requested(body)
+    started = time.perf_counter()
+    runs, writer = [], None
+    try:
+        publisher = Publisher()
+        slots = asyncio.Semaphore(concurrency)
+        writer = _batch_writer()
+        try:
+            runs = await asyncio.gather(
+                *(_arun_batch_item(index, publisher, writer, fresh, slots) for index in range(count))
+            )
+        finally:
+            await async_http.aclose()
+
+        generated = [run for run in runs if run[0]["status"] == "generated"]
+        if generated:
+            await asyncio.to_thread(_publish_batch, publisher, generated, writer)
+        return await asyncio.to_thread(_batch_response, runs, count, started, writer)
+
+    except Exception as e:
+        return await asyncio.to_thread(_fail_batch, runs, writer, e)
+
+def _sse(event, data, event_id=None):
+    message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return message if event_id is None else f"id: {event_id}\n{message}"
+
+# Once this section heading streams in, the title and the ingredient list the
+# image prompt is built from are complete.
+EARLY_IMAGE_MARKER = "## Instructions"
+
+@app.route("/api/scheduled-call/stream", methods=["GET"])
+def scheduled_call_stream():
+    """
+    Server-sent events version of /api/scheduled-call.
+
+    Streams post tokens as they are generated and starts image generation as
+    soon as the title and description are available, then reports each
+    remaining pipeline stage as it finishes.
+
+    Single-flighted like /api/scheduled-call: while another run is in flight
+    the stream waits for it and sends its result as the ``done`` event.
+    """
+    fresh = _fresh_requested()
+    action, claimed = _claim_scheduled_run()
+
+    def attached():
+        yield _sse("stage", {"stage": "coalesced", "status": "running"})
+        body, status = _coalesced_result(get_single_flight().join(claimed))
+        yield _sse("done" if status == HTTPStatus.OK else "error", body)
+
+    def generate(send):
+        """
+        Runs the whole generation in its own thread, reporting SSE messages
+        through `send` and None when done. The job is finished and the lease
+        released here, so a client disconnecting only stops the observer.
+        """
+        image_executor = ThreadPoolExecutor(max_workers=1)
+        ok = {"status": "ok"}
+        store = job = idea = None
+        try:
+            store, job, _, checkpoint = _start_job(None, fresh, on_stage=claimed.renew)
+            claimed.set_job(job["id"])
+            send(_sse("stage", {"stage": "idea", "status": "running"}))
+            idea, _ = generate_unique_idea(fresh=fresh, single=False)
+            if not idea:
+                store.finish(job["id"], FAILED, "Failed to generate a new blog post idea")
+                send(_sse("error", {"error": "Failed to generate a new blog post idea"}))
+                return
+            checkpoint("idea", ok, idea)
+            send(_sse("stage", {"stage": "idea", "status": "ok", "title": idea}))
+
+            post_content = ""
+            image_future = None
+            try:
+                for chunk in stream_blog_post(idea):
+                    post_content += chunk
+                    send(_sse("token", {"text": chunk}))
+                    if image_future is None and EARLY_IMAGE_MARKER in post_content:
+                        partial_post = post_content.split(EARLY_IMAGE_MARKER)[0]
+                        image_future = image_executor.submit(generate_food_image, idea, partial_post, fresh)
+                        send(_sse("stage", {"stage": "image", "status": "running"}))
+            except StreamError as e:
+                # Never checkpoint or publish a truncated post
+                _release_idea({"idea": idea})
+                store.finish(job["id"], FAILED, str(e))
+                send(_sse("error", {"error": f"Failed to generate blog post content: {e}"}))
+                return
+
+            if not post_content:
+                _release_idea({"idea": idea})
+                store.finish(job["id"], FAILED, "Failed to generate blog post content")
+                send(_sse("error", {"error": "Failed to generate blog post content"}))
+                return
+            checkpoint("post", ok, post_content)
+            send(_sse("stage", {"stage": "post", "status": "ok", "characters": len(post_content)}))
+
+            if image_future is None:
+                image_future = image_executor.submit(generate_food_image, idea, post_content, fresh)
+                send(_sse("stage", {"stage": "image", "status": "running"}))
+
+            def on_stage(stage, timing, value):
+                checkpoint(stage, timing, value)
+                send(_sse("stage", {"stage": stage, **timing}))
+
+            pipeline = build_post_pipeline(image_future=image_future)
+            job, outcome = _finish_job(store, job, pipeline.run({"idea": idea, "post": post_content}, on_stage),
+                                       publish=True)
+            if outcome.ok:
+                send(_sse("done", {
+                    "message": "Blog post published successfully!",
+                    "data": outcome.results["publish"],
+                    "job": _job_summary(job),
+                    "timings": outcome.timings_report()
+                }))
+            else:
+                send(_sse("error", {
+                    "error": _pipeline_error(outcome),
+                    "job": _job_summary(job),
+                    "timings": outcome.timings_report()
+                }))
+        except Exception as e:
+            print(f"❌ Unexpected error: {e}")
+            _release_idea({"idea": idea})
+            if job is not None:
+                store.finish(job["id"], FAILED, str(e))
+            send(_sse("error", {"error": f"An unexpected error occurred: {str(e)}"}))
+        finally:
+            image_executor.shutdown(wait=False)
+            claimed.release()
+            send(None)
+
+    def observe(messages):
+        while True:
+            message = messages.get()
+            if message is None:
+                return
+            yield message
+
+    if action == "busy":
+        stream = iter([_sse("error", {"error": "Too many pipelines are running, try again later"})])
+    elif action == "attach":
+        stream = attached()
+    else:
+        messages = Queue()
+        threading.Thread(target=generate, args=(messages.put,), daemon=True).start()
+        stream = observe(messages)
+    return Response(stream, mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.route("/api/events", methods=["GET"])
+def events_feed():
+    """
+    Server-sent change feed of the dashboard (see utils/events.py).
+
+    ``task`` events carry inserted or updated task rows, ``job`` and
+    ``stage`` events report pipeline progress. Every event has an id; a client
+    reconnecting with ``Last-Event-ID`` (sent by EventSource on its own) or
+    ``?last_event_id=`` gets the events it missed, otherwise the feed starts
+    at the newest event. ``reset`` means missed events are no longer kept and
+    the list should be reloaded.
+
+    The stream ends after EVENTS_STREAM_SECONDS (default 300) so a
+    serverless instance is not held forever; EventSource reconnects and
+    resumes.
+    """
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({"error": "last_event_id must be an integer"}), HTTPStatus.BAD_REQUEST
+    duration = float(os.getenv("EVENTS_STREAM_SECONDS", "300"))
+    poll_interval = float(os.getenv("EVENTS_POLL_INTERVAL", "1"))
+    log = get_event_log()
+
+    def stream():
+        nonlocal last_id
+        oldest, newest = log.bounds()
+        yield "retry: 3000\n\n"
+        if last_id is None:
+            last_id = newest
+        elif last_id > newest or (oldest and last_id < oldest - 1):
+            last_id = newest
+            yield _sse("reset", {}, event_id=last_id)
+
+        deadline = time.monotonic() + duration
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            events = log.since(last_id)
+            for event_id, kind, data in events:
+                yield _sse(kind, data, event_id=event_id)
+                last_id = event_id
+            if events:
+                last_sent = time.monotonic()
+                continue
+            if time.monotonic() - last_sent > 15:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            log.wait(poll_interval)
+
+    return Response(stream(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    """
+    Pipeline latency metrics.
+
+    ``?format=json`` (default) returns per-span histograms plus cache, image
+    endpoint and per-provider rate limit / circuit breaker stats,
+    ``?format=prometheus`` the Prometheus text format and ``?format=otlp``
+    recent spans as OTLP/JSON. ``?recent=N`` adds the last N spans to the
+    JSON output.
+    """
+    output = request.args.get("format", "json")
+    if output == "prometheus":
+        return Response(prometheus_text(), mimetype="text/plain; version=0.0.4")
+    if output == "otlp":
+        return jsonify(otlp_spans()), HTTPStatus.OK
+
+    body = {
+        "spans": metrics_snapshot(),
+        "cache": get_cache().stats(),
+        "image_endpoints": endpoint_stats(),
+        "providers": rate_limit.stats(),
+    }
+    recent = request.args.get("recent", type=int)
+    if recent:
+        body["recent"] = recent_spans(recent)
+    return jsonify(body), HTTPStatus.OK
+
+@app.route("/api/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify(get_cache().stats()), HTTPStatus.OK
 
 @app.route("/api/upload-image", methods=["POST"])
 def upload_image():
     try:
-        image_bytes = request.get_data() # Get raw bytes from the request body
+        # Stream the body to R2 instead of buffering it; the object is keyed
+        # by its content hash, so re-uploading the same image is a no-op
+        head, body = peek_stream(request.stream)
 
-        if not image_bytes:
+        if not head:
             return jsonify({"error": "No image bytes provided in the request body"}), HTTPStatus.BAD_REQUEST
-        
-        # Generate a unique filename. Assuming the uploaded image is a JPG.
-        file_name = f"uploaded-image-{datetime.now().strftime('%Y%m%d%H%M%S')}.jpg"
-        
-        image_url = upload_image_to_r2(image_bytes, file_name)
+
+        image_url = upload_stream_to_r2(body)
 
         if image_url:
             return jsonify({
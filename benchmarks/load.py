@@ -0,0 +1,254 @@
+"""
+Load test for the Flask app against local fakes of its upstream services.
+
+Starts the fakes from ``benchmarks/fakes.py``, points the app at them, serves
+it in-process on a threaded Werkzeug server and drives a weighted mix of
+routes with concurrent clients. Reports throughput and p50/p95/p99 latency
+per route, plus how many calls each fake served.
+
+Usage:
+    python benchmarks/load.py [--mix scheduled-call=1,posts=6,upload-image=3]
+                              [--concurrency 8] [--requests 200 | --duration 30]
+                              [--upload-bytes 200000] [--async]
+                              [--latency-ms 50] [--error-rate 0.01]
+                              [--service zai:latency_ms=800] [--json]
+                              [--max-p95-ms 2000] [--max-error-rate 0.05]
+
+With ``--url`` the load is sent to an already running app instead (start it
+with the environment printed by ``fakes.py``). With ``--max-p95-ms`` or
+``--max-error-rate`` the script exits non-zero when a route is over budget.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import fakes  # noqa: E402
+
+ROUTES = {
+    "scheduled-call": ("GET", "/api/scheduled-call?fresh=1"),
+    "posts": ("GET", "/api/posts?limit=20"),
+    "upload-image": ("POST", "/api/upload-image"),
+}
+ASYNC_ROUTES = {"scheduled-call": ("GET", "/api/async/scheduled-call?fresh=1")}
+
+
+def parse_mix(text):
+    mix = {}
+    for pair in filter(None, text.split(",")):
+        route, _, weight = pair.partition("=")
+        if route not in ROUTES:
+            raise SystemExit(f"❌ Unknown route '{route}', expected one of {', '.join(ROUTES)}")
+        mix[route] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, round(fraction * len(sorted_values) + 0.5))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def upload_body(size):
+    # A PNG signature so the app stores it as image/png
+    return b"\x89PNG\r\n\x1a\n" + random.randbytes(max(0, size - 8))
+
+
+@contextlib.contextmanager
+def local_app(fake_services, quiet=True, concurrency=64):
+    """
+    Serves the app in-process against `fake_services`; yields its base URL.
+    Up to `concurrency` scheduled runs may be in flight at once.
+    """
+    os.environ.update(fake_services.env())
+    state_dir = tempfile.mkdtemp(prefix="flavor-empire-bench-")
+    os.environ["LOCAL_STORE_DIR"] = state_dir
+    os.environ["JOB_STORE_PATH"] = os.path.join(state_dir, "jobs.sqlite3")
+    # Every scheduled call should be a fresh job, not a resume of a failed one
+    os.environ.setdefault("JOB_AUTO_RESUME", "false")
+    # ...and a pipeline run of its own rather than a coalesced wait on another
+    os.environ.setdefault("PIPELINE_COALESCE_WINDOW", "0")
+    os.environ.setdefault("PIPELINE_MAX_CONCURRENT", str(concurrency))
+
+    from werkzeug.serving import make_server
+
+    import app
+
+    if quiet:
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name="bench-app", daemon=True)
+    thread.start()
+    try:
+        # The app logs every step with print(); keep the report readable
+        with open(os.devnull, "w") as devnull, (contextlib.redirect_stdout(devnull) if quiet else contextlib.nullcontext()):
+            yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+
+
+def run_load(base_url, mix, concurrency, total=None, duration=None, upload_bytes=200_000, routes=ROUTES):
+    """
+    Sends requests from `concurrency` clients until `total` requests were sent
+    or `duration` seconds passed. Returns ``(samples, wall seconds)`` where a
+    sample is ``(route, status or None, seconds)``.
+    """
+    import requests
+
+    rng = random.Random(1234)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    schedule = (rng.choices(names, weights)[0] for _ in (range(total) if total else itertools.count()))
+    schedule_lock = threading.Lock()
+    body = upload_body(upload_bytes)
+    samples = []
+    sessions = threading.local()
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+
+    def next_route():
+        if deadline and time.perf_counter() >= deadline:
+            return None
+        with schedule_lock:
+            return next(schedule, None)
+
+    def client():
+        session = getattr(sessions, "session", None) or requests.Session()
+        sessions.session = session
+        while (route := next_route()) is not None:
+            method, path = routes.get(route) or ROUTES[route]
+            kwargs = {"data": body, "headers": {"Content-Type": "application/octet-stream"}} if method == "POST" else {}
+            sent = time.perf_counter()
+            try:
+                status = session.request(method, base_url + path, timeout=300, **kwargs).status_code
+            except requests.exceptions.RequestException:
+                status = None
+            samples.append((route, status, time.perf_counter() - sent))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(client) for _ in range(concurrency)]:
+            future.result()
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, wall):
+    report = {}
+    by_route = {}
+    for route, status, seconds in samples:
+        by_route.setdefault(route, []).append((status, seconds))
+    by_route["all"] = [(status, seconds) for _, status, seconds in samples]
+
+    for route, rows in by_route.items():
+        latencies = sorted(seconds * 1000 for _, seconds in rows)
+        errors = sum(1 for status, _ in rows if status is None or status >= 400)
+        statuses = {}
+        for status, _ in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        report[route] = {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": round(errors / len(rows), 4) if rows else 0.0,
+            "throughput_rps": round(len(rows) / wall, 2) if wall else 0.0,
+            "mean_ms": round(statistics.fmean(latencies), 1) if latencies else None,
+            "p50_ms": round(percentile(latencies, 0.50), 1) if latencies else None,
+            "p95_ms": round(percentile(latencies, 0.95), 1) if latencies else None,
+            "p99_ms": round(percentile(latencies, 0.99), 1) if latencies else None,
+            "max_ms": round(latencies[-1], 1) if latencies else None,
+            "statuses": dict(sorted(statuses.items())),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the app's routes under concurrent load.")
+    parser.add_argument("--mix", default="scheduled-call=1,posts=6,upload-image=3",
+                        help="comma separated route=weight pairs")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="total requests (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=None, help="run for this many seconds instead")
+    parser.add_argument("--upload-bytes", type=int, default=200_000, help="body size for /api/upload-image")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="use /api/async/scheduled-call")
+    parser.add_argument("--url", default=None, help="load an already running app instead of an in-process one")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's own log output")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--max-p95-ms", type=float, default=None)
+    parser.add_argument("--max-error-rate", type=float, default=None)
+    fakes.add_arguments(parser)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    routes = {**ROUTES, **(ASYNC_ROUTES if args.use_async else {})}
+    load = dict(
+        mix=mix,
+        concurrency=max(1, args.concurrency),
+        total=None if args.duration else max(1, args.requests),
+        duration=args.duration,
+        upload_bytes=args.upload_bytes,
+        routes=routes,
+    )
+
+    fake_stats = None
+    if args.url:
+        samples, wall = run_load(args.url.rstrip("/"), **load)
+    else:
+        with fakes.FakeServices(fakes.configs_from_args(args)) as fake_services:
+            with local_app(fake_services, quiet=not args.verbose, concurrency=load["concurrency"]) as base_url:
+                samples, wall = run_load(base_url, **load)
+            fake_stats = fake_services.stats()
+
+    report = {
+        "wall_s": round(wall, 2),
+        "concurrency": load["concurrency"],
+        "routes": summarize(samples, wall),
+    }
+    if fake_stats is not None:
+        report["upstream"] = fake_stats
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{len(samples)} requests in {report['wall_s']} s with {report['concurrency']} clients\n")
+        print(f"{'route':<16}{'reqs':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}  statuses")
+        for route, row in report["routes"].items():
+            print(
+                f"{route:<16}{row['requests']:>7}{row['errors']:>8}{row['throughput_rps']:>9}"
+                f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}  "
+                f"{', '.join(f'{k}: {v}' for k, v in row['statuses'].items())}"
+            )
+        if fake_stats is not None:
+            print("\nupstream calls: " + ", ".join(
+                f"{name} {row['requests']} ({', '.join(f'{k}: {v}' for k, v in row['statuses'].items()) or '-'})"
+                for name, row in fake_stats.items()
+            ))
+
+    over_budget = []
+    for route, row in report["routes"].items():
+        if args.max_p95_ms is not None and row["p95_ms"] is not None and row["p95_ms"] > args.max_p95_ms:
+            over_budget.append(f"{route} p95 {row['p95_ms']} ms > {args.max_p95_ms} ms")
+        if args.max_error_rate is not None and row["error_rate"] > args.max_error_rate:
+            over_budget.append(f"{route} error rate {row['error_rate']} > {args.max_error_rate}")
+    if over_budget:
+        print("❌ Over budget: " + "; ".join(over_budget))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
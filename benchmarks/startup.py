@@ -0,0 +1,92 @@
+"""
+Cold-start benchmark for the Flask app.
+
+Every sample runs in a fresh interpreter and measures how long ``import app``
+takes and how long the first request to a route takes, and lists which heavy
+third-party modules ended up loaded.
+
+Usage:
+    python benchmarks/startup.py [--routes / /api/posts] [--repeat 5]
+                                 [--max-import-ms 400] [--json]
+
+With ``--max-import-ms`` the script exits non-zero when the median import
+time exceeds the budget, so it can guard against regressions in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("supabase", "boto3", "botocore", "requests", "PIL", "httpx")
+
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+response = client.get({route!r})
+finished = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "first_request_ms": (finished - imported) * 1000,
+    "status": response.status_code,
+    "heavy_modules": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def sample(route):
+    code = CHILD.format(root=ROOT, route=route, heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True, text=True, cwd=ROOT, check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Benchmark for {route} failed:\n{result.stderr}")
+    # The app prints progress; the measurement is the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start latency per route.")
+    parser.add_argument("--routes", nargs="+", default=["/", "/api/posts"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for route in args.routes:
+        samples = [sample(route) for _ in range(max(1, args.repeat))]
+        report[route] = {
+            "import_ms": round(statistics.median(s["import_ms"] for s in samples), 1),
+            "first_request_ms": round(statistics.median(s["first_request_ms"] for s in samples), 1),
+            "status": samples[-1]["status"],
+            "heavy_modules": samples[-1]["heavy_modules"],
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'route':<24}{'import ms':>12}{'first req ms':>15}{'status':>8}  heavy modules loaded")
+        for route, row in report.items():
+            print(
+                f"{route:<24}{row['import_ms']:>12}{row['first_request_ms']:>15}{row['status']:>8}  "
+                f"{', '.join(row['heavy_modules']) or '-'}"
+            )
+
+    if args.max_import_ms is not None:
+        slowest = max(row["import_ms"] for row in report.values())
+        if slowest > args.max_import_ms:
+            print(f"❌ Import time {slowest} ms exceeds budget of {args.max_import_ms} ms")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
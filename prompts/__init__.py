@@ -1,138 +1,296 @@
 """
 prompt templates
-"""
 
+Static system messages are built once at import time; only the parts that
+depend on the idea or post are formatted per call. Image prompts are built
+from a compact dish summary (title + key ingredients) and kept within
+IMAGE_PROMPT_TOKEN_BUDGET estimated tokens (default 120).
+"""
+import json
+import math
+import os
+import re
+import unicodedata
 
-def new_blog_post_idea():
-    """
-    prompt template for new blog idea
-    add this
-        "messages": new_blog_idea()
-    """
-    return [
-        {
-            "role": "system",
-            "content": """
+IDEA_SYSTEM_PROMPT = """
 You are a helpful and creative chef assistant. You specialize in brainstorming engaging recipe titles that are always based on existing recipes already found on the internet. You also have a strong background in writing for social media and food blogs, so your recipe titles must be catchy and blog-worthy.
 Only output one recipe **title** per request, in plain text, without any additional explanation or formatting. Keep the title concise and appealing. Do not invent completely new dishes — use known recipe ideas, just rephrase or remix the titles creatively.
-            """,
-        },
-        {
-            "role": "user",
-            "content": """
-Give me a single catchy recipe title based on an existing recipe from the internet. Only output the title as plain text.
-
-            """,
-        },
-    ]
+""".strip()
 
+IDEA_USER_PROMPT = """
+Give me a single catchy recipe title based on an existing recipe from the internet. Only output the title as plain text.
+""".strip()
 
-def blog_post_prompt(idea):
-    """
-    prompt template for new blog idea
-    add this
-        "messages": new_blog_idea()
-    """
-    return [
-        {
-            "role": "system",
-            "content": """
+BLOG_POST_SYSTEM_PROMPT = """
 You are a professional food writer and recipe creator. You specialize in writing full recipe articles in Markdown format, based on existing recipes that are already available on the internet. Your writing should be clear, engaging, and suitable for blogs or food websites.
 
 Each article you generate must include the following Markdown structure:
 
-# Title  
+# Title
 A catchy recipe name (based on an existing internet recipe).
 
-## Description  
+## Description
 A short and engaging paragraph describing the dish and its appeal.
 
-## Ingredients  
+## Ingredients
 A bullet-point list of ingredients with quantities.
 
-## Instructions  
+## Instructions
 A step-by-step numbered list explaining how to prepare the recipe.
 
-## Tips  
+## Tips
 (Optional) 1–3 helpful cooking tips or serving suggestions.
 
 add CTA as lin [DOWNLOAD](https://enrageperplexparable.com/f3i1jxxx?key=0ec94d1ae3c0b6c8921f343d4f86ee0c) , dowlode reipe like some , recipe post incleu minmum 2 cta buttons
 Only use well-known recipe types and avoid inventing new dishes.
-Do an seo Reaserch and use key words prases add this Post. 
+Do an seo Reaserch and use key words prases add this Post.
 Use Emojis.
- 
- 
-            """,
-        },
+""".strip()
+
+_IDEA_MESSAGES = (
+    {"role": "system", "content": IDEA_SYSTEM_PROMPT},
+    {"role": "user", "content": IDEA_USER_PROMPT},
+)
+_BLOG_POST_SYSTEM_MESSAGE = {"role": "system", "content": BLOG_POST_SYSTEM_PROMPT}
+
+IDEA_AND_POST_USER_PROMPT = """
+Pick a single catchy recipe title based on an existing recipe from the internet, then write the complete recipe article about it.
+Reply with one JSON object and nothing else: {"title": "<the title as plain text>", "post": "<the full Markdown article>"}
+""".strip()
+
+_IDEA_AND_POST_MESSAGES = (
+    _BLOG_POST_SYSTEM_MESSAGE,
+    {"role": "user", "content": IDEA_AND_POST_USER_PROMPT},
+)
+
+# Style directives for the image prompt, most important first; trailing ones
+# are dropped when the token budget runs out.
+IMAGE_STYLE_CLAUSES = (
+    "photorealistic, natural true-to-life colors",
+    "soft natural window light from a 45° angle, golden hour",
+    "85mm lens, f/2.8, shallow depth of field, sharp focus on the dish",
+    "restaurant-quality plating on ceramic or slate, fresh herb garnish",
+    "overhead or 45° angle, rule of thirds, negative space for text",
+    "visible steam, glistening sauces, intricate textures",
+    "rustic wood or marble surface, blurred kitchen background",
+    "appetizing, vibrant, warm, editorial commercial food photography, 8K",
+)
+
+IMAGE_NEGATIVE_PROMPT = (
+    "cartoon, illustration, drawing, painting, blurry, deformed, low quality, "
+    "artificial, plastic-looking, overprocessed, unrealistic colors, digital art, "
+    "3D render, CGI, fake food, harsh lighting, deep shadows, cluttered background, "
+    "distracting props, messy plating, unappetizing presentation"
+)
+
+_HEADING = re.compile(r"^\s*#{1,6}\s*(.+?)\s*#*\s*$")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+•]|\d+[.)])\s+(.+)$")
+_QUANTITY = re.compile(
+    r"^(?:[\d¼½¾⅓⅔⅛/.,\-–\s]+|a |an |one |two |few )*"
+    r"(?:(?:cups?|tbsps?|tablespoons?|tsps?|teaspoons?|g|grams?|kg|ml|l|liters?|litres?|oz|ounces?|lbs?|"
+    r"pounds?|cloves?|pinch(?:es)?|dash(?:es)?|cans?|slices?|sticks?|bunch(?:es)?|handfuls?|"
+    r"large|medium|small)\b\.?\s*)*(?:of\s+)?",
+    re.IGNORECASE,
+)
+# Preparation notes such as "boneless", "finely chopped" or "to taste"
+_DESCRIPTORS = frozenset("""
+boneless skinless chopped diced minced sliced grated shredded peeled crushed melted softened cubed halved
+quartered trimmed rinsed drained beaten cooked divided optional finely roughly thinly freshly coarsely lightly
+cut into pieces strips cubes wedges inch thick thin about and or plus more to taste for garnish serving at room
+temperature
+""".split())
+
+
+def _with_avoid_list(messages, avoid):
+    messages = [dict(message) for message in messages]
+    if avoid:
+        titles = "\n".join(f"- {title}" for title in avoid)
+        messages[-1]["content"] += f"\nDo not use these titles or close variations of them, they are already taken:\n{titles}"
+    return messages
+
+
+def new_blog_post_idea(avoid=None):
+    """
+    prompt template for new blog idea
+    add this
+        "messages": new_blog_idea()
+    `avoid` lists titles the model must not repeat.
+    """
+    return _with_avoid_list(_IDEA_MESSAGES, avoid)
+
+
+def blog_post_prompt(idea):
+    """
+    prompt template for new blog idea
+    add this
+        "messages": new_blog_idea()
+    """
+    return [
+        dict(_BLOG_POST_SYSTEM_MESSAGE),
         {
             "role": "user",
-            "content": f"""
-Write a complete recipe article in Markdown format about the dish titled: {idea}.
-
-            """,
+            "content": f"Write a complete recipe article in Markdown format about the dish titled: {idea}.",
         },
     ]
 
 
-def image_prompt(idea, post):
+def idea_and_post_prompt(avoid=None):
+    """
+    prompt template asking for the title and the full post in one JSON reply
+    add this
+        "messages": idea_and_post_prompt(),
+        "response_format": {"type": "json_object"}
+    `avoid` lists titles the model must not repeat.
+    """
+    return _with_avoid_list(_IDEA_AND_POST_MESSAGES, avoid)
+
+
+def parse_idea_and_post(text):
     """
-    Generates a dynamic food photography prompt using variables.
+    Parses the reply to idea_and_post_prompt().
+
+    Returns:
+        tuple: (title, post); either is None when missing or unparsable.
+    """
+    if not text:
+        return None, None
+    text = text.strip()
+    fenced = re.match(r"^```(?:json)?\s*(.*?)\s*```$", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        data = json.loads(text[text.find("{"):text.rfind("}") + 1])
+    except ValueError:
+        return None, None
+    if not isinstance(data, dict):
+        return None, None
+
+    title = data.get("title")
+    post = data.get("post")
+    title = _plain(title).strip() if isinstance(title, str) else None
+    post = post.strip() if isinstance(post, str) else None
+    return title or None, post or None
+
+
+def _plain(text):
+    """
+    Strips Markdown markup and emoji from `text`.
+    """
+    text = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", text)
+    text = re.sub(r"[*_`~\"]", "", text)
+    text = "".join(ch for ch in text if unicodedata.category(ch) not in ("So", "Sk", "Cs", "Mn"))
+    return re.sub(r"\s+", " ", text).strip(" -:,")
+
+
+def _ingredient_name(item):
+    """
+    Reduces an ingredient line to its name, e.g. "2 boneless, skinless
+    chicken breasts (about 1 lb)" to "chicken breasts".
+    """
+    if item.rstrip(" *_").endswith(":"):
+        return ""  # a sub-heading such as "For the sauce:"
+    name = re.sub(r"\([^)]*\)", "", _plain(item))
+    parts = name.split(" - ")[0].split(":")
+    # "Sauce: 2 cups passata" names the ingredient after the colon,
+    # "Butter: 2 tbsp" before it
+    for part in reversed(parts):
+        for segment in _QUANTITY.sub("", part.strip()).split(","):
+            words = segment.split()
+            while words and words[0].lower().strip(".-") in _DESCRIPTORS:
+                words.pop(0)
+            # Comma-separated notes ("onion, finely chopped") leave no words
+            if words:
+                return " ".join(words).strip(" -.,")
+    return ""
+
+
+def dish_summary(post, max_ingredients=8):
+    """
+    Extracts the title and key ingredients from a Markdown recipe post.
+
+    Args:
+        post (str): Markdown post with a ``# Title`` and ``## Ingredients`` list.
+        max_ingredients (int): Number of ingredients kept, in post order.
+
+    Returns:
+        dict: {"title": str or None, "ingredients": [str, ...]}
+    """
+    title = None
+    ingredients = []
+    in_ingredients = False
+    for line in (post or "").splitlines():
+        heading = _HEADING.match(line)
+        if heading:
+            text = _plain(heading.group(1))
+            if title is None and line.lstrip().startswith("# "):
+                title = text
+            in_ingredients = "ingredient" in text.lower()
+            continue
+        if not in_ingredients:
+            continue
+        item = _LIST_ITEM.match(line)
+        if item:
+            name = _ingredient_name(item.group(1))
+            if name and name.lower() not in (i.lower() for i in ingredients):
+                ingredients.append(name)
+                if len(ingredients) >= max_ingredients:
+                    break
+    return {"title": title, "ingredients": ingredients}
+
+
+def estimate_tokens(text):
+    """
+    Rough token count (~4 characters per token), enough for budgeting.
+    """
+    return math.ceil(len(text) / 4)
+
+
+def prompt_size(prompt):
+    """
+    Returns {"chars", "bytes", "tokens"} for a prompt string or message list.
+    """
+    if not isinstance(prompt, str):
+        prompt = "\n".join(message["content"] for message in prompt)
+    return {
+        "chars": len(prompt),
+        "bytes": len(prompt.encode("utf-8")),
+        "tokens": estimate_tokens(prompt),
+    }
+
+
+def image_prompt(idea, post, token_budget=None):
+    """
+    Generates a compact food photography prompt for the dish.
 
     Args:
         idea (str): Main dish name (e.g., "gourmet cheeseburger")
-        post(str): Detailed description of the dish (e.g., "with aged cheddar, caramelized onions, and truffle aioli on brioche bun")
+        post(str): Markdown recipe post the key ingredients are taken from
+        token_budget (int): Max estimated tokens; IMAGE_PROMPT_TOKEN_BUDGET
+            (default 120) when omitted
 
     Returns:
-        str: Complete image generation prompt with dynamic variables
-    """
-    prompt = f"""Professional food photography of {idea}, {post}.
-
-CAMERA & LENS:
-- Camera: Canon EOS R5 or Sony A7R IV
-- Lens: 85mm f/1.2 or 100mm f/2.8 macro
-- Settings: f/2.8 aperture, 1/200s shutter speed, ISO 100
-
-LIGHTING:
-- Primary: Soft natural window light from 45° angle
-- Secondary: Subtle fill light from opposite side
-- Reflector: Silver reflector to fill shadows
-- Atmosphere: Morning or late afternoon golden hour light
-
-COMPOSITION:
-- Angle: Overhead or 45° perspective
-- Focus: Sharp focus on main subject with shallow depth of field
-- Framing: Rule of thirds placement, negative space for text overlay
-- Props: Minimal, complementary items (e.g., utensils, ingredients)
-
-STYLING:
-- Plating: Restaurant-quality presentation on ceramic or slate
-- Garnishes: Fresh herbs, microgreens, edible flowers, spice dust
-- Texture: Visible steam (if warm), glistening sauces, fresh ingredients
-- Authenticity: Natural food appearance, no artificial enhancements
-
-BACKGROUND:
-- Surface: Rustic wood, marble, or linen tablecloth
-- Setting: Blurred kitchen or dining environment
-- Depth: Layered background with warm, inviting atmosphere
-- Color Palette: Complementary colors to the dish
-
-MOOD & STYLE:
-- Mood: Appetizing, vibrant, fresh, inviting
-- Style: Commercial food photography, editorial quality
-- Color: Natural, true-to-life colors with rich saturation
-- Atmosphere: Warm, homey, professional yet approachable
-
-TECHNICAL SPECIFICATIONS:
-- Resolution: 8K ultra-high definition
-- Detail: Intricate textures, realistic food surfaces
-- Realism: Photorealistic, no illustration or cartoon elements
-- Quality: Professional food photography standards
-- Exclusions: No artificial filters, no digital enhancements, no props that distract from food
-
-NEGATIVE PROMPT:
-- cartoon, illustration, drawing, painting, blurry, deformed, low quality
-- artificial, plastic-looking, overprocessed, unrealistic colors
-- digital art, 3D render, CGI, fake food, inedible appearance
-- harsh lighting, deep shadows, cluttered background, distracting props
-- unrealistic garnishes, messy plating, unappetizing presentation"""
-    return prompt.strip()
+        str: Image generation prompt; send IMAGE_NEGATIVE_PROMPT separately
+    """
+    if token_budget is None:
+        token_budget = int(os.getenv("IMAGE_PROMPT_TOKEN_BUDGET", "120"))
+
+    summary = dish_summary(post)
+    dish = _plain(idea or "") or summary["title"] or "a signature dish"
+    ingredients = list(summary["ingredients"])
+
+    def subject():
+        text = f"Professional food photography of {dish}"
+        if ingredients:
+            text += f", made with {', '.join(ingredients)}"
+        return text
+
+    # Keep at least the dish name; shed ingredients first, then style clauses
+    while ingredients and estimate_tokens(subject()) > token_budget:
+        ingredients.pop()
+    prompt = subject()
+    for clause in IMAGE_STYLE_CLAUSES:
+        candidate = f"{prompt}. {clause}"
+        if estimate_tokens(candidate) > token_budget:
+            break
+        prompt = candidate
+    return prompt
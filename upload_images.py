@@ -0,0 +1,178 @@
+"""
+Bulk image uploader.
+
+Walks a directory and uploads every image through ``utils.upload_image``
+(the app's /api/upload-image route) with a bounded thread pool.
+
+Progress is appended to a JSON-lines manifest (path, size, mtime, sha256,
+url), so an interrupted run resumes where it stopped: files whose path, size
+and mtime match a manifest entry are skipped, and a file with the same
+content as one already uploaded reuses its URL without being sent again.
+Objects are keyed by content hash on the server, so retrying is safe.
+
+Usage:
+    python upload_images.py DIRECTORY [--manifest upload-manifest.jsonl]
+                            [--workers 4] [--url URL]
+
+The manifest doubles as the mapping from local files to public URLs.
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils import http_client, upload_image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif")
+
+
+def find_images(directory):
+    """
+    Yields ``(relative path, absolute path)`` for every image under `directory`,
+    in a stable order.
+    """
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, directory), path
+
+
+def load_manifest(path):
+    """
+    Returns ``(entries by relative path, URLs by sha256)`` from a manifest.
+    """
+    entries, urls = {}, {}
+    if not os.path.exists(path):
+        return entries, urls
+    with open(path, encoding="utf-8") as manifest:
+        for line in manifest:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted run
+            if entry.get("url"):
+                entries[entry["path"]] = entry
+                urls[entry["sha256"]] = entry["url"]
+    return entries, urls
+
+
+class BulkUploader:
+    def __init__(self, manifest_path, url=None):
+        self.manifest_path = manifest_path
+        self.url = url
+        self.entries, self.urls = load_manifest(manifest_path)
+        self.counts = {"uploaded": 0, "resumed": 0, "deduplicated": 0, "failed": 0}
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._manifest = open(manifest_path, "a", encoding="utf-8")
+
+    def close(self):
+        self._manifest.close()
+
+    def _record(self, entry):
+        with self._lock:
+            self.urls[entry["sha256"]] = entry["url"]
+            self._manifest.write(json.dumps(entry) + "\n")
+            self._manifest.flush()
+
+    def _count(self, outcome, size=0):
+        with self._lock:
+            self.counts[outcome] += 1
+            self.bytes_sent += size
+
+    def upload(self, relative_path, path):
+        """
+        Uploads one file unless the manifest already has it. Returns the outcome.
+        """
+        try:
+            stat = os.stat(path)
+            known = self.entries.get(relative_path)
+            if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+                self._count("resumed")
+                return "resumed"
+            with open(path, "rb") as image:
+                data = image.read()
+        except OSError as e:
+            print(f"❌ Could not read {relative_path}: {e}")
+            self._count("failed")
+            return "failed"
+
+        entry = {
+            "path": relative_path,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": hashlib.sha256(data).hexdigest(),
+        }
+
+        url = self.urls.get(entry["sha256"])
+        if url:
+            self._record({**entry, "url": url})
+            self._count("deduplicated")
+            return "deduplicated"
+
+        url = upload_image(data, url=self.url)
+        if not url:
+            self._count("failed")
+            return "failed"
+        self._record({**entry, "url": url})
+        self._count("uploaded", len(data))
+        return "uploaded"
+
+
+def run(directory, manifest_path, workers, url=None):
+    uploader = BulkUploader(manifest_path, url=url)
+    files = list(find_images(directory))
+    print(f"📦 {len(files)} images in {directory}, {len(uploader.entries)} already in {manifest_path}")
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(uploader.upload, *paths) for paths in files]
+            for done, future in enumerate(as_completed(futures), start=1):
+                future.result()
+                if done % 50 == 0 or done == len(files):
+                    elapsed = time.perf_counter() - started
+                    print(f"⏳ {done}/{len(files)} files, {done / elapsed:.1f} files/s")
+    finally:
+        uploader.close()
+        http_client.close_all()
+
+    elapsed = time.perf_counter() - started
+    counts = uploader.counts
+    print(
+        f"✅ Done in {elapsed:.1f} s: {counts['uploaded']} uploaded, {counts['deduplicated']} duplicates, "
+        f"{counts['resumed']} already done, {counts['failed']} failed"
+    )
+    print(
+        f"📈 {len(files) / elapsed if elapsed else 0:.1f} files/s, "
+        f"{uploader.bytes_sent / 1e6 / elapsed if elapsed else 0:.2f} MB/s uploaded"
+    )
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload a directory of images, resuming from a manifest.")
+    parser.add_argument("directory")
+    parser.add_argument("--manifest", default="upload-manifest.jsonl",
+                        help="JSON-lines manifest used to resume (default: upload-manifest.jsonl)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("UPLOAD_WORKERS", "4")),
+                        help="parallel uploads (default: UPLOAD_WORKERS or 4)")
+    parser.add_argument("--url", default=None,
+                        help="upload route (default: UPLOAD_IMAGE_URL or the production app)")
+    args = parser.parse_args()
+    try:
+        counts = run(args.directory, args.manifest, max(1, args.workers), url=args.url)
+    except KeyboardInterrupt:
+        print("👋 Upload interrupted, run again to resume")
+        return
+    if counts["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,52 @@
-import requests
 import os
 
-def upload_image(image_byte):
-    url = "https://the-flavor-emperor-ai.vercel.app/api/upload-image"
+from utils import http_client
+
+UPLOAD_IMAGE_URL = "https://the-flavor-emperor-ai.vercel.app/api/upload-image"
+
+def upload_image(image_byte, url=None):
+    """
+    Posts image bytes to the app's /api/upload-image route.
+
+    `url` defaults to UPLOAD_IMAGE_URL (env) or the production deployment.
+    Objects are keyed by content hash, so the call is safe to retry and
+    re-uploading an image that is already stored does not transfer it to R2
+    again.
+
+    Returns:
+        str: The public URL of the stored image, or None on failure.
+    """
+    import requests
+
+    url = url or os.getenv("UPLOAD_IMAGE_URL", UPLOAD_IMAGE_URL)
 
     # Check if the image file exists
     if image_byte is None:
         print(f"Error: Image data file not found  ")
-    else:
-         
+        return None
+
+    # Set the headers
+    headers = {
+        "Content-Type": "application/octet-stream"
+    }
 
-        # Set the headers
-        headers = {
-            "Content-Type": "application/octet-stream"
-        }
+    try:
+        # Send the POST request with the image bytes as the body
+        response = http_client.post(url, provider="upload", data=image_byte, headers=headers)
 
+        # Check the response
+        if response.status_code == 200:
+            image_url = response.json().get("image_url")
+            print(f"Image uploaded successfully! {image_url}")
+            return image_url
+
+        print(f"Error uploading image. Status code: {response.status_code}")
         try:
-            # Send the POST request with the image bytes as the body
-            response = requests.post(url, data=image_byte, headers=headers)
-
-            # Check the response
-            if response.status_code == 200:
-                print("Image uploaded successfully!")
-                print("Response JSON:", response.json())
-            else:
-                print(f"Error uploading image. Status code: {response.status_code}")
-                try:
-                    print("Error response:", response.json())
-                except requests.exceptions.JSONDecodeError:
-                    print("Error response:", response.text)
-
-        except requests.exceptions.RequestException as e:
-            print(f"An error occurred: {e}")
+            print("Error response:", response.json())
+        except requests.exceptions.JSONDecodeError:
+            print("Error response:", response.text)
+        return None
+
+    except requests.exceptions.RequestException as e:
+        print(f"An error occurred: {e}")
+        return None
@@ -0,0 +1,93 @@
+"""
+Async counterpart of ``utils.http_client`` built on httpx.
+
+One pooled ``httpx.AsyncClient`` is kept per running event loop, with the
+same timeouts, pool sizes and HTTP_HOST_OVERRIDES as the sync sessions, and
+calls tagged with a `provider` go through the same rate limits, retries and
+circuit breakers (``utils.rate_limit``). Flask runs every async view in its
+own event loop, so views should ``await aclose()`` when they are done.
+"""
+import asyncio
+import weakref
+
+from utils import rate_limit
+from utils.http_client import _env_number, default_timeout, resolve_url
+
+_clients = weakref.WeakKeyDictionary()
+_transport = None
+
+
+def mount(transport):
+    """
+    Sends every request of clients created from now on through `transport`,
+    e.g. an ``httpx.MockTransport`` for local runs.
+    """
+    global _transport
+    _transport = transport
+
+
+def get_client():
+    """
+    Returns the pooled AsyncClient of the running event loop.
+    """
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        connect, read = default_timeout()
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(
+                max_connections=_env_number("HTTP_POOL_MAXSIZE", 16, int) * _env_number("HTTP_POOL_CONNECTIONS", 4, int),
+                max_keepalive_connections=_env_number("HTTP_POOL_MAXSIZE", 16, int),
+            ),
+            transport=_transport,
+        )
+        _clients[loop] = client
+    return client
+
+
+async def request(method, url, provider=None, idempotent=True, **kwargs):
+    """
+    Sends a request with the loop's pooled client.
+
+    Accepts the keyword arguments of ``httpx.AsyncClient.request``. With
+    `provider` the call is rate limited, retried and circuit broken like
+    ``http_client.request``, including ``idempotent``; an open circuit
+    raises ``httpx.ConnectError``.
+    """
+    import httpx
+
+    url = resolve_url(url)
+    client = get_client()
+    if provider is None:
+        return await client.request(method, url, **kwargs)
+
+    try:
+        return await rate_limit.acall(
+            provider,
+            lambda: client.request(method, url, **kwargs),
+            key=url,
+            retry_exceptions=(httpx.ConnectError, httpx.ConnectTimeout),
+            idempotent=idempotent,
+        )
+    except rate_limit.CircuitOpenError as e:
+        raise httpx.ConnectError(str(e)) from e
+
+
+async def post(url, **kwargs):
+    return await request("POST", url, **kwargs)
+
+
+async def get(url, **kwargs):
+    return await request("GET", url, **kwargs)
+
+
+async def aclose():
+    """
+    Closes the running loop's client, e.g. at the end of an async view.
+    """
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
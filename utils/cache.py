@@ -0,0 +1,218 @@
+"""
+Content-addressed cache for LLM completions and generated images.
+
+Responses are keyed by a hash of everything that influences the output
+(model, messages, sampling params, image prompt), so retried or resumed runs
+with identical prompts are served locally instead of calling the API again.
+
+Environment variables:
+    RESPONSE_CACHE_BACKEND   ``memory`` (default), ``sqlite`` or ``none``
+    RESPONSE_CACHE_TTL       seconds an entry stays valid (default 86400)
+    RESPONSE_CACHE_MAXSIZE   max entries of the memory backend (default 256)
+    RESPONSE_CACHE_PATH      SQLite file (default ``response-cache.sqlite3``
+                             in the local store directory)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.storage import connect, local_path
+
+
+def cache_key(payload):
+    """
+    Returns a stable hash of a JSON-serializable request payload.
+    """
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """
+    Thread-safe LRU cache whose entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize=256, ttl=86400):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache:
+    """
+    On-disk cache that survives restarts; stores text and raw bytes.
+    """
+
+    def __init__(self, path, ttl=86400):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = connect(path)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, is_text INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, is_text, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, is_text, expires_at = row
+            if expires_at < time.time():
+                with self._db:
+                    self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+        return value.decode("utf-8") if is_text else bytes(value)
+
+    def set(self, key, value):
+        is_text = isinstance(value, str)
+        blob = value.encode("utf-8") if is_text else bytes(value)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, is_text, expires_at) VALUES (?, ?, ?, ?)",
+                (key, blob, int(is_text), time.time() + self.ttl),
+            )
+
+    def delete(self, key):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM cache")
+
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class ResponseCache:
+    """
+    Wraps a backend with per-namespace hit/miss counters.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _count(self, namespace, field):
+        with self._lock:
+            stats = self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "bypassed": 0})
+            stats[field] += 1
+
+    def _lookup(self, namespace, payload, bypass):
+        key = f"{namespace}:{cache_key(payload)}"
+        if bypass:
+            self._count(namespace, "bypassed")
+            return key, None
+        value = self.backend.get(key)
+        if value is not None:
+            self._count(namespace, "hits")
+            print(f"♻️ Cache hit for {namespace}")
+        else:
+            self._count(namespace, "misses")
+        return key, value
+
+    def get_or_set(self, namespace, payload, compute, bypass=False):
+        """
+        Returns the cached value for `payload`, or calls `compute()` and caches
+        its result. With `bypass` the cache is not read, but a fresh result
+        still replaces the stored one. None results are never cached.
+        """
+        key, value = self._lookup(namespace, payload, bypass)
+        if value is not None:
+            return value
+        value = compute()
+        if value is not None:
+            self.backend.set(key, value)
+        return value
+
+    async def aget_or_set(self, namespace, payload, compute, bypass=False):
+        """
+        Async get_or_set: `compute` is a coroutine function.
+        """
+        key, value = self._lookup(namespace, payload, bypass)
+        if value is not None:
+            return value
+        value = await compute()
+        if value is not None:
+            self.backend.set(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            snapshot = {namespace: dict(stats) for namespace, stats in self._stats.items()}
+        for stats in snapshot.values():
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        return {"backend": type(self.backend).__name__, "namespaces": snapshot}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Returns the process-wide response cache configured from the environment.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                backend_name = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+                ttl = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+                if backend_name == "sqlite":
+                    path = os.getenv("RESPONSE_CACHE_PATH") or local_path("response-cache.sqlite3")
+                    backend = SQLiteCache(path, ttl=ttl)
+                elif backend_name == "none":
+                    backend = NullCache()
+                else:
+                    backend = MemoryCache(int(os.getenv("RESPONSE_CACHE_MAXSIZE", "256")), ttl=ttl)
+                _cache = ResponseCache(backend)
+    return _cache
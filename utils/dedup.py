@@ -0,0 +1,203 @@
+"""
+Near-duplicate detection for recipe titles.
+
+Titles are normalised (case, accents, emoji, punctuation, filler words like
+"easy" or "best", word order), split into character shingles and indexed with
+MinHash + LSH banding, so checking a new idea against every stored title only
+compares it with a handful of likely candidates. Candidates are then scored
+with the exact Jaccard similarity of their shingle sets.
+
+The index is loaded once from the stored titles and then kept up to date with
+``add`` after each insert. ``claim`` checks a new idea and reserves it in one
+step, so concurrent pipelines cannot both accept the same title; a run that
+fails before its row is written gives the title back with ``release``.
+
+Environment variables:
+    IDEA_DEDUP_THRESHOLD    Jaccard similarity at which a title counts as a
+                            duplicate (default 0.7; 0 disables the check)
+"""
+import hashlib
+import os
+import random
+import re
+import threading
+import unicodedata
+
+SHINGLE_SIZE = 4
+NUM_PERMUTATIONS = 16
+BAND_ROWS = 1
+
+# Words that don't change which dish a title is about.
+FILLER_WORDS = frozenset("""
+a an and the with of in on for to my our your best easy quick simple ultimate perfect
+classic homemade delicious tasty amazing recipe recipes style
+""".split())
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240813)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def normalize_title(title):
+    """
+    Reduces a title to its sorted, de-accented significant words.
+    """
+    text = unicodedata.normalize("NFKD", title or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    words = []
+    for word in re.findall(r"[a-z0-9]+", text):
+        if word in FILLER_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return " ".join(sorted(words))
+
+
+def shingles(normalized, size=SHINGLE_SIZE):
+    if len(normalized) <= size:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def minhash(shingle_set):
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+        for s in shingle_set
+    ]
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class TitleIndex:
+    def __init__(self, threshold=None):
+        if threshold is None:
+            threshold = float(os.getenv("IDEA_DEDUP_THRESHOLD", "0.7"))
+        self.threshold = threshold
+        self.loaded = False
+        self._titles = {}     # normalized title -> (original title, shingles)
+        self._buckets = {}    # (band, band hash) -> set of normalized titles
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._titles)
+
+    def _bands(self, signature):
+        for band, start in enumerate(range(0, NUM_PERMUTATIONS, BAND_ROWS)):
+            yield band, signature[start:start + BAND_ROWS]
+
+    def _add_locked(self, title, normalized, shingle_set, signature):
+        if normalized in self._titles:
+            return
+        self._titles[normalized] = (title, shingle_set)
+        for band in self._bands(signature):
+            self._buckets.setdefault(band, set()).add(normalized)
+
+    def add(self, title):
+        normalized = normalize_title(title)
+        if not normalized:
+            return
+        shingle_set = shingles(normalized)
+        signature = minhash(shingle_set)
+        with self._lock:
+            self._add_locked(title, normalized, shingle_set, signature)
+
+    def release(self, title):
+        """
+        Removes `title`, e.g. a claimed idea whose run failed before its row
+        was written.
+        """
+        normalized = normalize_title(title)
+        with self._lock:
+            entry = self._titles.pop(normalized, None)
+            if entry is None:
+                return
+            for band in self._bands(minhash(entry[1])):
+                members = self._buckets.get(band)
+                if members is not None:
+                    members.discard(normalized)
+
+    def load(self, titles):
+        """
+        Adds every title in `titles` and marks the index as loaded.
+        """
+        for title in titles:
+            self.add(title)
+        self.loaded = True
+
+    def find_similar(self, title):
+        """
+        Returns ``(stored title, similarity)`` for the closest stored title at
+        or above the threshold, or None.
+        """
+        return self._check(title, reserve=False)
+
+    def claim(self, title):
+        """
+        find_similar() that also adds `title` when it is not a duplicate,
+        under the same lock. Returns the match, or None once reserved.
+        """
+        return self._check(title, reserve=True)
+
+    def _check(self, title, reserve):
+        if self.threshold <= 0:
+            return None
+        normalized = normalize_title(title)
+        if not normalized:
+            return None
+
+        shingle_set = shingles(normalized)
+        signature = minhash(shingle_set)
+        with self._lock:
+            exact = self._titles.get(normalized)
+            if exact:
+                return exact[0], 1.0
+            candidates = set()
+            for band in self._bands(signature):
+                candidates |= self._buckets.get(band, set())
+            scored = [
+                (jaccard(shingle_set, self._titles[candidate][1]), self._titles[candidate][0])
+                for candidate in candidates
+            ]
+            best = max(scored) if scored else (0.0, None)
+            if best[0] < self.threshold:
+                if reserve:
+                    self._add_locked(title, normalized, shingle_set, signature)
+                return None
+
+        score, stored_title = best
+        return stored_title, round(score, 3)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_title_index(load_titles=None):
+    """
+    Returns the shared TitleIndex, loading it with ``load_titles()`` (an
+    iterable of titles) on first use. A failed load is retried on the next
+    call; meanwhile the index only holds titles added since start-up.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = TitleIndex()
+        if not _index.loaded and load_titles is not None:
+            try:
+                _index.load(load_titles())
+                print(f"📚 Loaded {len(_index)} titles into the dedup index")
+            except Exception as e:
+                print(f"⚠️ Could not load titles for the dedup index: {e}")
+        return _index
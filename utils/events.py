@@ -0,0 +1,97 @@
+"""
+Change feed of the dashboard.
+
+Task row writes and pipeline progress are appended to a local SQLite log
+shared by the app's processes and the worker. Event ids increase, so
+/api/events can send them as server-sent event ids and a reconnecting
+EventSource resumes after ``Last-Event-ID`` without missing or repeating
+events. Only the most recent events are kept; a client asking to resume from
+an older id is told to reload instead.
+
+Environment variables:
+    EVENT_LOG_PATH          SQLite file (default ``events.sqlite3`` in the local store)
+    EVENT_LOG_RETENTION     events kept (default 1000)
+"""
+import json
+import os
+import threading
+
+from utils.storage import connect, local_path
+
+
+class EventLog:
+    def __init__(self, path=None, retention=None):
+        self.retention = max(1, retention or int(os.getenv("EVENT_LOG_RETENTION", "1000")))
+        self._lock = threading.Lock()
+        self._appended = threading.Condition()
+        self._db = connect(path or os.getenv("EVENT_LOG_PATH") or local_path("events.sqlite3"))
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, data TEXT NOT NULL)"
+            )
+
+    def append(self, kind, data):
+        """
+        Appends an event and returns its id.
+        """
+        with self._lock, self._db:
+            event_id = self._db.execute(
+                "INSERT INTO events (kind, data) VALUES (?, ?)", (kind, json.dumps(data))
+            ).lastrowid
+            if event_id % 100 == 0:
+                self._db.execute("DELETE FROM events WHERE id <= ?", (event_id - self.retention,))
+        with self._appended:
+            self._appended.notify_all()
+        return event_id
+
+    def since(self, last_id, limit=100):
+        """
+        Returns up to `limit` ``(id, kind, data)`` events after `last_id`.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, kind, data FROM events WHERE id > ? ORDER BY id LIMIT ?", (last_id, limit)
+            ).fetchall()
+        return [(event_id, kind, json.loads(data)) for event_id, kind, data in rows]
+
+    def bounds(self):
+        """
+        Returns ``(oldest id, last id)`` of the kept events, 0 when empty.
+        """
+        with self._lock:
+            oldest, last = self._db.execute("SELECT MIN(id), MAX(id) FROM events").fetchone()
+        return oldest or 0, last or 0
+
+    def wait(self, timeout):
+        """
+        Sleeps until this process appends an event or `timeout` seconds pass.
+        Events appended by other processes are picked up on the next ``since``.
+        """
+        with self._appended:
+            self._appended.wait(timeout)
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_event_log():
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = EventLog()
+    return _log
+
+
+def emit(kind, data):
+    """
+    Appends an event to the shared log. Failures are logged, never raised,
+    so the feed cannot break the pipeline.
+    """
+    try:
+        return get_event_log().append(kind, data)
+    except Exception as e:
+        print(f"⚠️ Could not record {kind} event: {e}")
+        return None
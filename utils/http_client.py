@@ -0,0 +1,165 @@
+"""
+Shared, pooled HTTP sessions for every outbound API call.
+
+One keep-alive ``requests.Session`` is kept per upstream host (api.z.ai, the
+Hugging Face router, gql.hashnode.com, ...) so repeated calls reuse the same
+TCP/TLS connection instead of paying a fresh handshake each time.
+
+Environment variables:
+    HTTP_POOL_CONNECTIONS   number of connection pools per session (default 4)
+    HTTP_POOL_MAXSIZE       max open connections kept per pool (default 16)
+    HTTP_CONNECT_TIMEOUT    seconds to wait for a connection (default 5)
+    HTTP_READ_TIMEOUT       seconds to wait for a response (default 120)
+    HTTP_HOST_OVERRIDES     comma separated ``host=base_url`` pairs used to point
+                            a host at a local mock, e.g.
+                            ``api.z.ai=http://127.0.0.1:8001``
+"""
+import os
+import threading
+from urllib.parse import urlsplit, urlunsplit
+
+_sessions = {}
+_transports = {}
+_lock = threading.Lock()
+
+
+def _env_number(name, default, cast=float):
+    try:
+        return cast(os.getenv(name, default))
+    except (TypeError, ValueError):
+        print(f"⚠️ Invalid value for {name}, using {default}")
+        return cast(default)
+
+
+def default_timeout():
+    """
+    Returns the default ``(connect, read)`` timeout tuple.
+    """
+    return (
+        _env_number("HTTP_CONNECT_TIMEOUT", 5),
+        _env_number("HTTP_READ_TIMEOUT", 120),
+    )
+
+
+def _host_overrides():
+    overrides = {}
+    for pair in os.getenv("HTTP_HOST_OVERRIDES", "").split(","):
+        if "=" not in pair:
+            continue
+        host, base_url = pair.split("=", 1)
+        overrides[host.strip()] = base_url.strip().rstrip("/")
+    return overrides
+
+
+def resolve_url(url):
+    """
+    Applies ``HTTP_HOST_OVERRIDES`` to `url`, keeping its path and query.
+    """
+    parts = urlsplit(url)
+    base_url = _host_overrides().get(parts.netloc)
+    if not base_url:
+        return url
+    base = urlsplit(base_url)
+    return urlunsplit((base.scheme, base.netloc, base.path + parts.path, parts.query, parts.fragment))
+
+
+def _build_session():
+    # requests is imported here so importing this module stays cheap
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=_env_number("HTTP_POOL_CONNECTIONS", 4, int),
+        pool_maxsize=_env_number("HTTP_POOL_MAXSIZE", 16, int),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    for prefix, transport in _transports.items():
+        session.mount(prefix, transport)
+    return session
+
+
+def get_session(url):
+    """
+    Returns the shared keep-alive session for the host of `url`.
+    """
+    parts = urlsplit(url)
+    host_key = f"{parts.scheme}://{parts.netloc}"
+    session = _sessions.get(host_key)
+    if session is None:
+        with _lock:
+            session = _sessions.get(host_key)
+            if session is None:
+                session = _build_session()
+                _sessions[host_key] = session
+    return session
+
+
+def mount(prefix, adapter):
+    """
+    Routes every request whose URL starts with `prefix` through `adapter`.
+
+    Useful for plugging in an in-process transport for local runs, e.g. a
+    ``requests.adapters.BaseAdapter`` that returns canned responses.
+    """
+    with _lock:
+        _transports[prefix] = adapter
+        for session in _sessions.values():
+            session.mount(prefix, adapter)
+
+
+def request(method, url, provider=None, idempotent=True, **kwargs):
+    """
+    Sends a request over the pooled session for `url`'s host.
+
+    Accepts the same keyword arguments as ``requests.request``; a default
+    connect/read timeout is applied when none is given. With `provider`
+    (``"zai"``, ``"hf"``, ``"hashnode"``) the call goes through that
+    provider's rate limit, retry policy and per-endpoint circuit breaker
+    (see ``utils.rate_limit``); an open circuit raises ``ConnectionError``.
+    Pass ``idempotent=False`` for calls that must not run twice.
+    """
+    url = resolve_url(url)
+    kwargs.setdefault("timeout", default_timeout())
+    session = get_session(url)
+    if provider is None:
+        return session.request(method, url, **kwargs)
+
+    import requests
+    from utils import rate_limit
+
+    try:
+        return rate_limit.call(
+            provider,
+            lambda: session.request(method, url, **kwargs),
+            key=url,
+            # Connection errors (including connect timeouts) mostly mean nothing
+            # was sent; read timeouts are not retried as the upstream may have
+            # processed the request. A dropped connection can also happen
+            # after sending, so non-idempotent calls only retry connect timeouts.
+            retry_exceptions=(
+                (requests.exceptions.ConnectionError,) if idempotent else (requests.exceptions.ConnectTimeout,)
+            ),
+            idempotent=idempotent,
+        )
+    except rate_limit.CircuitOpenError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def close_all():
+    """
+    Closes every pooled session, e.g. before a worker process exits.
+    """
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,113 @@
+"""
+Post-processing of generated images before they are uploaded to R2.
+
+The raw Stable Diffusion output (often a multi-megabyte PNG) is decoded,
+stripped of metadata and re-encoded as a WebP cover of at most
+IMAGE_COVER_WIDTH px, the single image URL posts and task rows store.
+Encoding runs in a process pool so it does not hold up the request thread.
+
+Requires Pillow; without it callers fall back to uploading the raw bytes.
+
+Environment variables:
+    IMAGE_COVER_WIDTH       max width of the cover in px (default 1600)
+    IMAGE_WEBP_QUALITY      WebP quality (default 80)
+    IMAGE_PROCESS_WORKERS   size of the process pool (default 2, 0 = in-thread)
+"""
+import importlib.util
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.image_uploader import upload_image_to_r2
+from utils.tracing import span
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _cover_width():
+    try:
+        return int(os.getenv("IMAGE_COVER_WIDTH", "1600"))
+    except ValueError:
+        return 1600
+
+
+def process_image(image_bytes):
+    """
+    Encodes `image_bytes` as the WebP cover.
+
+    Returns:
+        dict: ``width``, ``content_type``, ``extension`` and ``data``.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(image_bytes)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    image.info = {}  # drop EXIF, ICC and text chunks
+
+    # Never upscale
+    width = min(_cover_width(), image.width)
+    if width != image.width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=int(os.getenv("IMAGE_WEBP_QUALITY", "80")), method=6)
+    return {"width": width, "content_type": "image/webp", "extension": "webp", "data": buffer.getvalue()}
+
+
+def _get_pool():
+    global _pool
+    workers = int(os.getenv("IMAGE_PROCESS_WORKERS", "2"))
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # Forking a multi-threaded server process is unsafe; prefer forkserver
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else None)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return _pool
+
+
+def process_in_pool(image_bytes):
+    """
+    Runs process_image in the process pool, or in this thread when a pool
+    cannot be used (e.g. no multiprocessing support on the platform).
+    """
+    try:
+        pool = _get_pool()
+        if pool is not None:
+            return pool.submit(process_image, image_bytes).result()
+    except (OSError, RuntimeError, NotImplementedError) as e:
+        print(f"⚠️ Image process pool unavailable, processing in-thread: {e}")
+    return process_image(image_bytes)
+
+
+def process_and_upload(image_bytes):
+    """
+    Processes `image_bytes` into the WebP cover and uploads it to R2, keyed
+    by the hash of its bytes so an identical cover is stored once.
+
+    Returns:
+        str: The cover URL, or None if Pillow is missing or anything fails.
+    """
+    if importlib.util.find_spec("PIL") is None:
+        print("⚠️ Pillow is not installed, uploading the original image")
+        return None
+
+    try:
+        with span("image.process", request_bytes=len(image_bytes)) as s:
+            cover = process_in_pool(image_bytes)
+            s.set(response_bytes=len(cover["data"]))
+    except Exception as e:
+        print(f"❌ Error processing image: {e}")
+        return None
+
+    print(f"🖼️ Processed image into a {cover['width']} px cover ({len(image_bytes)} -> {len(cover['data'])} bytes)")
+    url = upload_image_to_r2(cover["data"], content_type=cover["content_type"])
+    if not url:
+        print("❌ Error uploading the processed cover")
+    return url
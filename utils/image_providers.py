@@ -0,0 +1,199 @@
+"""
+Hedged fan-out over several image generation endpoints.
+
+Instead of trying endpoints strictly one after another, the primary endpoint
+is called first and the next one is "hedged" in if no image has arrived after
+a delay (or straight away when the previous one failed). The first valid image
+wins; requests that have not started yet are cancelled and the ones already in
+flight are left to finish in the background, their results discarded.
+
+Per-endpoint latency and success stats are kept in memory and used to try the
+healthiest, fastest endpoint first on the next call.
+
+Environment variables:
+    HF_IMAGE_STRATEGY       ``sequential``, ``hedged`` (default) or ``race``
+    HF_HEDGE_DELAY          seconds before hedging to the next endpoint (default 10)
+    HF_HEDGE_MAX_PARALLEL   max endpoints in flight at once, i.e. the cost cap
+                            (default 2; ``race`` defaults to all endpoints)
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+# Weight of the newest sample in the latency moving average.
+EWMA_ALPHA = 0.3
+
+
+def record_result(url, ok, seconds):
+    """
+    Records the outcome of one call to `url`.
+    """
+    with _stats_lock:
+        stats = _stats.setdefault(url, {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "avg_latency_s": None,
+        })
+        stats["calls"] += 1
+        if ok:
+            stats["successes"] += 1
+            if stats["avg_latency_s"] is None:
+                stats["avg_latency_s"] = seconds
+            else:
+                stats["avg_latency_s"] = EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * stats["avg_latency_s"]
+        else:
+            stats["failures"] += 1
+
+
+def endpoint_stats():
+    """
+    Returns a snapshot of the per-endpoint stats.
+    """
+    with _stats_lock:
+        return {url: dict(stats) for url, stats in _stats.items()}
+
+
+def ordered_endpoints(urls):
+    """
+    Sorts `urls` by success rate, then average latency. Endpoints without
+    history keep their configured position relative to each other and are
+    tried before endpoints that have only failed.
+    """
+    snapshot = endpoint_stats()
+
+    def score(item):
+        position, url = item
+        stats = snapshot.get(url)
+        if not stats or not stats["calls"]:
+            return (-1.0, float("inf"), position)
+        success_rate = stats["successes"] / stats["calls"]
+        latency = stats["avg_latency_s"] if stats["avg_latency_s"] is not None else float("inf")
+        return (-success_rate, latency, position)
+
+    return [url for _, url in sorted(enumerate(urls), key=score)]
+
+
+def strategy_settings(endpoint_count):
+    """
+    Returns ``(hedge_delay, max_parallel)`` for the configured strategy.
+    """
+    strategy = os.getenv("HF_IMAGE_STRATEGY", "hedged").lower()
+    if strategy == "sequential":
+        return None, 1
+
+    try:
+        hedge_delay = float(os.getenv("HF_HEDGE_DELAY", "10"))
+    except ValueError:
+        hedge_delay = 10.0
+    default_parallel = endpoint_count if strategy == "race" else 2
+    try:
+        max_parallel = int(os.getenv("HF_HEDGE_MAX_PARALLEL", default_parallel))
+    except ValueError:
+        max_parallel = default_parallel
+
+    if strategy == "race":
+        hedge_delay = 0.0
+    return hedge_delay, max(1, min(max_parallel, endpoint_count))
+
+
+def _timed(fetch, url):
+    started = time.perf_counter()
+    try:
+        result = fetch(url)
+    except Exception as e:
+        print(f"❌ Request to {url} failed: {e}")
+        result = None
+    record_result(url, result is not None, time.perf_counter() - started)
+    return result
+
+
+def fetch_first(urls, fetch, hedge_delay=None, max_parallel=1):
+    """
+    Calls ``fetch(url)`` over `urls` and returns the first non-None result.
+
+    A new endpoint is started when the previous one fails, or when
+    `hedge_delay` seconds pass without a result while fewer than
+    `max_parallel` calls are in flight. Returns None if every endpoint fails.
+    """
+    remaining = list(urls)
+    in_flight = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, max_parallel))
+    try:
+        while remaining or in_flight:
+            if remaining and (not in_flight or (hedge_delay is not None and len(in_flight) < max_parallel)):
+                url = remaining.pop(0)
+                if in_flight:
+                    print(f"⏱️ Hedging image request to {url}")
+                context = contextvars.copy_context()
+                in_flight[executor.submit(context.run, _timed, fetch, url)] = url
+                if hedge_delay == 0 and remaining and len(in_flight) < max_parallel:
+                    continue
+
+            can_hedge = remaining and hedge_delay is not None and len(in_flight) < max_parallel
+            done, _ = wait(
+                in_flight,
+                timeout=hedge_delay if can_hedge else None,
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done:
+                url = in_flight.pop(future)
+                result = future.result()
+                if result is not None:
+                    print(f"✅ Image received from {url}")
+                    return result
+        return None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _atimed(fetch, url):
+    started = time.perf_counter()
+    try:
+        result = await fetch(url)
+    except Exception as e:
+        print(f"❌ Request to {url} failed: {e}")
+        result = None
+    record_result(url, result is not None, time.perf_counter() - started)
+    return result
+
+
+async def afetch_first(urls, fetch, hedge_delay=None, max_parallel=1):
+    """
+    Async fetch_first: `fetch` is a coroutine function. Calls still in
+    flight once a result arrives are cancelled.
+    """
+    remaining = list(urls)
+    in_flight = {}
+    try:
+        while remaining or in_flight:
+            if remaining and (not in_flight or (hedge_delay is not None and len(in_flight) < max_parallel)):
+                url = remaining.pop(0)
+                if in_flight:
+                    print(f"⏱️ Hedging image request to {url}")
+                in_flight[asyncio.ensure_future(_atimed(fetch, url))] = url
+                if hedge_delay == 0 and remaining and len(in_flight) < max_parallel:
+                    continue
+
+            can_hedge = remaining and hedge_delay is not None and len(in_flight) < max_parallel
+            done, _ = await asyncio.wait(
+                in_flight,
+                timeout=hedge_delay if can_hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                url = in_flight.pop(task)
+                result = task.result()
+                if result is not None:
+                    print(f"✅ Image received from {url}")
+                    return result
+        return None
+    finally:
+        for task in in_flight:
+            task.cancel()
@@ -1,57 +1,294 @@
+import hashlib
 import os
-import boto3
-from botocore.client import Config
-from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+import tempfile
+import threading
+
+from utils import rate_limit
+from utils.tracing import span
+
+PUBLIC_BASE_URL = "https://cdn.image.sniplyx.xyz"
+
+# Bodies larger than this are sent as a multipart upload.
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+
+# Content-addressed objects never change, so they can be cached forever.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_r2_client = None
+_r2_lock = threading.Lock()
+
+# Keys known to be in the bucket, so repeated uploads skip even the HEAD call
+_stored_keys = set()
+_stored_keys_lock = threading.Lock()
+
+# (magic bytes, offset, content type, extension)
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", 0, "image/jpeg", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", 0, "image/png", "png"),
+    (b"GIF87a", 0, "image/gif", "gif"),
+    (b"GIF89a", 0, "image/gif", "gif"),
+    (b"WEBP", 8, "image/webp", "webp"),
+    (b"ftypavif", 4, "image/avif", "avif"),
+    (b"ftypavis", 4, "image/avif", "avif"),
+)
 
 def get_r2_client():
     """
-    Initializes and returns a boto3 client for Cloudflare R2.
+    Returns the shared boto3 client for Cloudflare R2, creating it on first use.
+
+    boto3 clients are thread-safe and keep a connection pool, so one client is
+    reused for every upload instead of reloading botocore's service models.
+    """
+    global _r2_client
+    if _r2_client is not None:
+        return _r2_client
+
+    with _r2_lock:
+        if _r2_client is not None:
+            return _r2_client
+
+        try:
+            account_id = os.environ['R2_ACCOUNT_ID']
+            access_key_id = os.environ['R2_ACCESS_KEY_ID']
+            access_key_secret = os.environ['R2_SECRET_ACCESS_KEY']
+            bucket_name = os.environ['R2_BUCKET_NAME']
+        except KeyError as e:
+            raise ValueError(f"Missing required environment variable: {e}")
+
+        # R2_ENDPOINT_URL points the client at another S3-compatible store,
+        # e.g. the local fake used by benchmarks/load.py
+        endpoint_url = os.getenv("R2_ENDPOINT_URL") or f"https://{account_id}.r2.cloudflarestorage.com"
+
+        # boto3 is slow to import; only load it once an upload happens
+        import boto3
+        from botocore.client import Config
+
+        s3_client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=access_key_secret,
+            config=Config(
+                signature_version='s3v4',
+                max_pool_connections=int(os.getenv("R2_MAX_POOL_CONNECTIONS", "20")),
+                # botocore's adaptive mode retries throttled/5xx calls with
+                # backoff and slows the client down on throttling responses
+                retries={
+                    "mode": "adaptive",
+                    "max_attempts": int(os.getenv("R2_RETRY_ATTEMPTS", os.getenv("RETRY_ATTEMPTS", "3"))),
+                },
+            )
+        )
+        _r2_client = (s3_client, bucket_name)
+        return _r2_client
+
+def detect_image_type(data):
+    """
+    Detects the image format from its first bytes.
+
+    Returns:
+        tuple: (content type, file extension); ("application/octet-stream",
+        "bin") when the format is not recognised.
+    """
+    for magic, offset, content_type, extension in IMAGE_SIGNATURES:
+        if data[offset:offset + len(magic)] == magic:
+            return content_type, extension
+    return "application/octet-stream", "bin"
+
+class _PrefixedStream:
+    """
+    File-like wrapper that replays already consumed bytes before `stream`.
+    """
+
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def read(self, size=-1):
+        if not self._prefix:
+            return self._stream.read(size)
+        if size is None or size < 0:
+            data, self._prefix = self._prefix + self._stream.read(), b""
+            return data
+        data, self._prefix = self._prefix[:size], self._prefix[size:]
+        if len(data) < size:
+            data += self._stream.read(size - len(data))
+        return data
+
+def peek_stream(stream, size=32):
+    """
+    Reads the first `size` bytes of `stream` without losing them.
+
+    Returns:
+        tuple: (first bytes, file-like object yielding the whole stream)
+    """
+    head = stream.read(size)
+    return head, _PrefixedStream(head, stream)
+
+def _public_url(file_name):
+    return f"{PUBLIC_BASE_URL}/{file_name}"
+
+def content_key(digest, extension):
+    """
+    Object key for content with the given SHA-256 hex `digest`; identical
+    bytes always map to the same key.
+    """
+    return f"{digest[:32]}.{extension}"
+
+def _remember_key(key):
+    with _stored_keys_lock:
+        _stored_keys.add(key)
+
+def object_exists(key):
+    """
+    True if `key` is already stored, checking the local index of keys seen by
+    this process before sending a HEAD request to R2.
     """
+    if key in _stored_keys:
+        return True
+
+    from botocore.exceptions import ClientError
+
+    s3_client, bucket_name = get_r2_client()
+    missing = False
     try:
-        account_id = os.environ['R2_ACCOUNT_ID']
-        access_key_id = os.environ['R2_ACCESS_KEY_ID']
-        access_key_secret = os.environ['R2_SECRET_ACCESS_KEY']
-        bucket_name = os.environ['R2_BUCKET_NAME']
-    except KeyError as e:
-        raise ValueError(f"Missing required environment variable: {e}")
-
-    endpoint_url = f"https://{account_id}.r2.cloudflarestorage.com"
-
-    s3_client = boto3.client(
-        's3',
-        endpoint_url=endpoint_url,
-        aws_access_key_id=access_key_id,
-        aws_secret_access_key=access_key_secret,
-        config=Config(signature_version='s3v4')
-    )
-    return s3_client, bucket_name
-
-def upload_image_to_r2(image_bytes, file_name):
+        with span("r2.head"), rate_limit.limited("r2"):
+            try:
+                s3_client.head_object(Bucket=bucket_name, Key=key)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+                    raise
+                # A missing key is a normal answer, not an R2 failure for the breaker
+                missing = True
+    except ClientError as e:
+        print(f"⚠️ Could not check whether {key} exists, uploading it: {e}")
+        return False
+    if missing:
+        return False
+    _remember_key(key)
+    return True
+
+def upload_image_to_r2(image_bytes, file_name=None, content_type=None):
     """
     Uploads an image to a Cloudflare R2 bucket and returns the public URL.
 
+    Without `file_name` the object is keyed by the SHA-256 of its bytes and
+    the upload is skipped when that key is already stored.
+
     Args:
         image_bytes (bytes): The image data.
-        file_name (str): The desired file name for the image in the bucket.
+        file_name (str): Optional file name for the image in the bucket.
+        content_type (str): Optional MIME type; detected from the bytes if omitted.
 
     Returns:
         str: The public URL of the uploaded image, or None if the upload fails.
     """
+    from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+
     try:
+        detected_type, extension = detect_image_type(image_bytes)
+        content_type = content_type or detected_type
+        extra = {}
+        if file_name is None:
+            file_name = content_key(hashlib.sha256(image_bytes).hexdigest(), extension)
+            if object_exists(file_name):
+                print(f"♻️ {file_name} is already in R2, skipping upload.")
+                return _public_url(file_name)
+            extra["CacheControl"] = IMMUTABLE_CACHE_CONTROL
+
         s3_client, bucket_name = get_r2_client()
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=file_name,
-            Body=image_bytes,
-            ContentType='image/jpeg'  # Assuming JPEG, adjust if necessary
-        )
-        
-        # Construct the public URL
-        account_id = os.environ['R2_ACCOUNT_ID']
-        public_url = f"https://cdn.image.sniplyx.xyz/{file_name}"
-        
+        with span("r2.upload", request_bytes=len(image_bytes)), rate_limit.limited("r2"):
+            s3_client.put_object(
+                Bucket=bucket_name,
+                Key=file_name,
+                Body=image_bytes,
+                ContentType=content_type,
+                **extra
+            )
+
+        _remember_key(file_name)
+        print(f"Successfully uploaded {file_name} to R2.")
+        return _public_url(file_name)
+
+    except (NoCredentialsError, PartialCredentialsError):
+        print("❌ Error: AWS credentials not found. Please check your environment variables.")
+        return None
+    except Exception as e:
+        print(f"❌ An error occurred during R2 upload: {e}")
+        return None
+
+def _spool(stream):
+    """
+    Copies `stream` into a temporary file (in memory up to
+    MULTIPART_THRESHOLD) while hashing it.
+
+    Returns:
+        tuple: (spooled file rewound to the start, SHA-256 hex digest)
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=MULTIPART_THRESHOLD)
+    digest = hashlib.sha256()
+    while True:
+        chunk = stream.read(1024 * 1024)
+        if not chunk:
+            break
+        digest.update(chunk)
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled, digest.hexdigest()
+
+def upload_stream_to_r2(stream, file_name=None, content_type=None):
+    """
+    Uploads a file-like object to R2 without holding it all in memory.
+
+    Bodies above MULTIPART_THRESHOLD are sent as a multipart upload in
+    parallel chunks. Without `file_name` the stream is spooled to a temporary
+    file to hash it, the object is keyed by its SHA-256 and the upload is
+    skipped when that key is already stored.
+
+    Args:
+        stream: A readable binary file-like object.
+        file_name (str): Optional file name for the image in the bucket.
+        content_type (str): MIME type stored with the object; detected from
+            the first bytes if omitted.
+
+    Returns:
+        str: The public URL of the uploaded image, or None if the upload fails.
+    """
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+
+    spooled = None
+    try:
+        head, stream = peek_stream(stream)
+        detected_type, extension = detect_image_type(head)
+        content_type = content_type or detected_type
+        extra = {"ContentType": content_type}
+        if file_name is None:
+            spooled, digest = _spool(stream)
+            stream = spooled
+            file_name = content_key(digest, extension)
+            if object_exists(file_name):
+                print(f"♻️ {file_name} is already in R2, skipping upload.")
+                return _public_url(file_name)
+            extra["CacheControl"] = IMMUTABLE_CACHE_CONTROL
+
+        s3_client, bucket_name = get_r2_client()
+        with span("r2.upload_stream"), rate_limit.limited("r2"):
+            s3_client.upload_fileobj(
+                stream,
+                bucket_name,
+                file_name,
+                ExtraArgs=extra,
+                Config=TransferConfig(
+                    multipart_threshold=MULTIPART_THRESHOLD,
+                    multipart_chunksize=MULTIPART_THRESHOLD,
+                    max_concurrency=4,
+                )
+            )
+
+        _remember_key(file_name)
         print(f"Successfully uploaded {file_name} to R2.")
-        return public_url
+        return _public_url(file_name)
 
     except (NoCredentialsError, PartialCredentialsError):
         print("❌ Error: AWS credentials not found. Please check your environment variables.")
@@ -59,3 +296,6 @@ def upload_image_to_r2(image_bytes, file_name):
     except Exception as e:
         print(f"❌ An error occurred during R2 upload: {e}")
         return None
+    finally:
+        if spooled is not None:
+            spooled.close()
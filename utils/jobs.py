@@ -0,0 +1,226 @@
+"""
+Persisted post generation jobs.
+
+Every pipeline run is a job whose finished stage results ("artifacts") are
+written to a local SQLite store as soon as each stage completes. A failed job
+can be resumed later: stages that already have an artifact are not run again,
+so a transient publish failure does not re-spend the LLM and image calls.
+
+Environment variables:
+    JOB_STORE_PATH     SQLite file (default ``jobs.sqlite3`` in the local store)
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+from utils.events import emit
+from utils.storage import connect, local_path
+
+# Milestones in pipeline order, with the stage that completes each one.
+STATES = (
+    ("idea_done", "idea"),
+    ("post_done", "post"),
+    ("image_uploaded", "image"),
+    ("row_inserted", "insert"),
+    ("draft_created", "draft"),
+    ("published", "publish"),
+)
+
+QUEUED = "queued"
+READY = "ready"         # pre-generated, waiting in the pool to be published
+RUNNING = "running"
+FAILED = "failed"
+COMPLETED = "completed"
+
+
+def job_state(artifacts):
+    """
+    Returns the furthest milestone reached without gaps, or ``created``.
+    """
+    state = "created"
+    for name, stage in STATES:
+        if stage not in artifacts:
+            break
+        state = name
+    return state
+
+
+class JobStore:
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        self._db = connect(path or os.getenv("JOB_STORE_PATH") or local_path("jobs.sqlite3"))
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, state TEXT NOT NULL, "
+                "artifacts TEXT NOT NULL, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, options TEXT NOT NULL DEFAULT '{}')"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            if "options" not in columns:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN options TEXT NOT NULL DEFAULT '{}'")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, updated_at)")
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job_id, status, state, artifacts, error, attempts, created_at, updated_at, options = row
+        return {
+            "id": job_id,
+            "status": status,
+            "state": state,
+            "artifacts": json.loads(artifacts),
+            "error": error,
+            "attempts": attempts,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "options": json.loads(options),
+        }
+
+    def _fetch(self, where, params=()):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, state, artifacts, error, attempts, created_at, updated_at, options "
+                f"FROM jobs {where}", params
+            ).fetchone()
+        return self._to_dict(row)
+
+    def create(self, status=RUNNING, options=None):
+        """
+        Creates an empty job; a job created as running counts as one attempt.
+        `options` holds run settings such as ``{"fresh": true}``.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO jobs (id, status, state, artifacts, attempts, created_at, updated_at, options) "
+                "VALUES (?, ?, 'created', '{}', ?, ?, ?, ?)",
+                (job_id, status, int(status == RUNNING), now, now, json.dumps(options or {})),
+            )
+        return self.get(job_id)
+
+    def enqueue(self, options=None):
+        return self.create(status=QUEUED, options=options)
+
+    def claim_next(self):
+        """
+        Marks the oldest queued job as running and returns it, or None.
+        """
+        while True:
+            job = self._fetch("WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,))
+            if job is None:
+                return None
+            if self.start_attempt(job["id"], expected_status=QUEUED):
+                return self.get(job["id"])
+
+    def claim_ready(self):
+        """
+        Marks the oldest pre-generated (ready) job as running and returns it,
+        or None when the pool is empty.
+        """
+        while True:
+            job = self._fetch("WHERE status = ? ORDER BY created_at LIMIT 1", (READY,))
+            if job is None:
+                return None
+            if self.start_attempt(job["id"], expected_status=READY):
+                return self.get(job["id"])
+
+    def count(self, status):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def ideas(self, statuses=(READY, RUNNING)):
+        """
+        Returns the ideas of the jobs in `statuses`, e.g. pooled or in-flight
+        posts whose task row is not written yet.
+        """
+        marks = ", ".join("?" for _ in statuses)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT artifacts FROM jobs WHERE status IN ({marks})", tuple(statuses)
+            ).fetchall()
+        ideas = [json.loads(artifacts).get("idea") for (artifacts,) in rows]
+        return [idea for idea in ideas if idea]
+
+    def fail_stale(self, max_age):
+        """
+        Marks running jobs not updated for `max_age` seconds as failed, e.g.
+        after a worker crashed, so they become retryable. Returns the count.
+        """
+        with self._lock, self._db:
+            return self._db.execute(
+                "UPDATE jobs SET status = ?, error = 'Job stalled', updated_at = ? "
+                "WHERE status = ? AND updated_at < ?",
+                (FAILED, time.time(), RUNNING, time.time() - max_age),
+            ).rowcount
+
+    def get(self, job_id):
+        return self._fetch("WHERE id = ?", (job_id,))
+
+    def claim_failed(self, max_attempts=3):
+        """
+        Marks the most recent retryable failed job as running and returns it,
+        or None. Safe against two callers claiming the same job.
+        """
+        while True:
+            job = self._fetch(
+                "WHERE status = ? AND attempts < ? ORDER BY updated_at DESC LIMIT 1",
+                (FAILED, max_attempts),
+            )
+            if job is None:
+                return None
+            if self.start_attempt(job["id"], expected_status=FAILED):
+                return self.get(job["id"])
+
+    def start_attempt(self, job_id, expected_status=None):
+        """
+        Moves the job to running and counts the attempt. With
+        `expected_status`, only succeeds if the job is still in that status.
+        """
+        query = "UPDATE jobs SET status = ?, error = NULL, attempts = attempts + 1, updated_at = ? WHERE id = ?"
+        params = [RUNNING, time.time(), job_id]
+        if expected_status is not None:
+            query += " AND status = ?"
+            params.append(expected_status)
+        with self._lock, self._db:
+            return self._db.execute(query, params).rowcount == 1
+
+    def save_artifact(self, job_id, stage, value):
+        """
+        Stores the result of `stage` and advances the job state.
+        """
+        with self._lock, self._db:
+            row = self._db.execute("SELECT artifacts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            artifacts = json.loads(row[0])
+            artifacts[stage] = value
+            self._db.execute(
+                "UPDATE jobs SET artifacts = ?, state = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(artifacts), job_state(artifacts), time.time(), job_id),
+            )
+
+    def finish(self, job_id, status, error=None):
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+        emit("job", {"id": job_id, "status": status, "error": error})
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_job_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = JobStore()
+    return _store
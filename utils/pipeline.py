@@ -0,0 +1,239 @@
+"""
+Tiny dependency-graph runner used to execute the post generation stages.
+
+Stages are plain functions registered with the names of the stages they
+depend on. Each stage is called with its dependencies' results as keyword
+arguments and runs on a thread pool as soon as all of them are done, so
+independent stages overlap. ``arun`` does the same on an asyncio event loop,
+awaiting coroutine stages and running plain ones in worker threads.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from utils.tracing import span
+
+_provider_limits = {}
+_provider_lock = threading.Lock()
+_async_provider_limits = weakref.WeakKeyDictionary()
+
+
+class StageError(Exception):
+    """
+    Raised by a stage to abort the pipeline with a user facing message.
+    """
+
+
+def _provider_max_concurrency(provider):
+    try:
+        limit = int(os.getenv(f"{provider.upper()}_MAX_CONCURRENCY", "4"))
+    except ValueError:
+        limit = 4
+    return max(limit, 1)
+
+
+def provider_limit(provider):
+    """
+    Returns the semaphore bounding concurrent calls to `provider`.
+
+    The limit is read from ``<PROVIDER>_MAX_CONCURRENCY`` (e.g.
+    ``HF_MAX_CONCURRENCY=2``) and defaults to 4.
+    """
+    with _provider_lock:
+        semaphore = _provider_limits.get(provider)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(_provider_max_concurrency(provider))
+            _provider_limits[provider] = semaphore
+        return semaphore
+
+
+def aprovider_limit(provider):
+    """
+    provider_limit for async stages; one semaphore per event loop.
+    """
+    limits = _async_provider_limits.setdefault(asyncio.get_running_loop(), {})
+    semaphore = limits.get(provider)
+    if semaphore is None:
+        semaphore = asyncio.BoundedSemaphore(_provider_max_concurrency(provider))
+        limits[provider] = semaphore
+    return semaphore
+
+
+class PipelineResult:
+    def __init__(self):
+        self.results = {}
+        self.timings = {}
+        self.failed_stage = None
+        self.error = None
+        self.total_ms = 0.0
+
+    @property
+    def ok(self):
+        return self.failed_stage is None
+
+    def timings_report(self):
+        """
+        Returns per-stage timings plus the end-to-end wall clock, in ms.
+        """
+        report = dict(self.timings)
+        report["total"] = {"ms": self.total_ms, "status": "ok" if self.ok else "failed"}
+        return report
+
+
+class Pipeline:
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.stages = {}
+
+    def add(self, name, func, deps=(), provider=None):
+        """
+        Registers stage `name`; `func` is called with one keyword argument per
+        dependency, holding that stage's result. When `provider` is given the
+        stage waits for a slot in that provider's concurrency limit.
+        """
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = (func, tuple(deps), provider)
+        return self
+
+    def _run_stage(self, name, kwargs):
+        func, _, provider = self.stages[name]
+        started = time.perf_counter()
+        try:
+            with span(f"stage.{name}"):
+                if provider:
+                    with provider_limit(provider):
+                        return func(**kwargs), None, started
+                return func(**kwargs), None, started
+        except Exception as e:
+            return None, e, started
+
+    async def _arun_stage(self, name, kwargs):
+        func, _, provider = self.stages[name]
+        started = time.perf_counter()
+        try:
+            with span(f"stage.{name}"):
+                if provider:
+                    async with aprovider_limit(provider):
+                        return await self._acall(func, kwargs), None, started
+                return await self._acall(func, kwargs), None, started
+        except Exception as e:
+            return None, e, started
+
+    @staticmethod
+    async def _acall(func, kwargs):
+        if asyncio.iscoroutinefunction(func):
+            return await func(**kwargs)
+        return await asyncio.to_thread(func, **kwargs)
+
+    @staticmethod
+    def _start(results):
+        outcome = PipelineResult()
+        outcome.results = dict(results or {})
+        for name in outcome.results:
+            outcome.timings[name] = {"ms": 0.0, "status": "reused"}
+        return outcome
+
+    @staticmethod
+    def _finish_stage(outcome, name, value, error, started):
+        elapsed = round((time.perf_counter() - started) * 1000, 1)
+        if error is not None:
+            outcome.timings[name] = {"ms": elapsed, "status": "failed"}
+            if outcome.failed_stage is None:
+                outcome.failed_stage = name
+                outcome.error = error
+        else:
+            outcome.timings[name] = {"ms": elapsed, "status": "ok"}
+            outcome.results[name] = value
+
+    def run(self, results=None, on_stage=None):
+        """
+        Executes every stage not already present in `results`.
+
+        `on_stage`, if given, is called as ``on_stage(name, timing, value)``
+        each time a stage finishes, with the timing dict reported in the result
+        and the stage's return value (None if it failed).
+
+        Stops scheduling new stages as soon as one fails, but lets the stages
+        already running finish and reports them to `on_stage`, so their
+        results are checkpointed instead of being paid for again on resume.
+        """
+        outcome = self._start(results)
+        pending = {name for name in self.stages if name not in outcome.results}
+        running = {}
+        started_at = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while pending or running:
+                for name in self._ready(pending, outcome):
+                    pending.discard(name)
+                    kwargs = {dep: outcome.results[dep] for dep in self.stages[name][1]}
+                    # Run in a copy of the caller's context so stage spans join its trace
+                    context = contextvars.copy_context()
+                    running[executor.submit(context.run, self._run_stage, name, kwargs)] = name
+
+                if not running:
+                    # Nothing can make progress: a stage failed or a
+                    # dependency never completed.
+                    for name in pending:
+                        outcome.timings[name] = {"ms": 0.0, "status": "skipped"}
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    self._finish_stage(outcome, name, *future.result())
+                    if on_stage is not None:
+                        on_stage(name, outcome.timings[name], outcome.results.get(name))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            outcome.total_ms = round((time.perf_counter() - started_at) * 1000, 1)
+        return outcome
+
+    async def arun(self, results=None, on_stage=None):
+        """
+        Async run(): stages run as tasks on the current event loop, limited by
+        the provider semaphores instead of a thread pool. Like run(), stages
+        still running when another one fails are awaited, not cancelled.
+        """
+        outcome = self._start(results)
+        pending = {name for name in self.stages if name not in outcome.results}
+        running = {}
+        started_at = time.perf_counter()
+        try:
+            while pending or running:
+                for name in self._ready(pending, outcome):
+                    pending.discard(name)
+                    kwargs = {dep: outcome.results[dep] for dep in self.stages[name][1]}
+                    running[asyncio.ensure_future(self._arun_stage(name, kwargs))] = name
+
+                if not running:
+                    for name in pending:
+                        outcome.timings[name] = {"ms": 0.0, "status": "skipped"}
+                    break
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    self._finish_stage(outcome, name, *task.result())
+                    if on_stage is not None:
+                        on_stage(name, outcome.timings[name], outcome.results.get(name))
+        finally:
+            for task in running:
+                task.cancel()
+            outcome.total_ms = round((time.perf_counter() - started_at) * 1000, 1)
+        return outcome
+
+    def _ready(self, pending, outcome):
+        if outcome.failed_stage is not None:
+            return []
+        return [
+            name for name in pending
+            if all(dep in outcome.results for dep in self.stages[name][1])
+        ]
+
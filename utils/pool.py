@@ -0,0 +1,68 @@
+"""
+Settings of the pre-generation pool.
+
+Pool items are jobs in the local job store whose idea, post, processed image
+and Hashnode draft (with the cover image attached) are already done, left in
+the ``ready`` status. Publishing one only takes the publishDraft call and the
+row insert.
+
+Environment variables:
+    POOL_SIZE               ready items to keep (default 0: no pre-generation)
+    POOL_REFILL_WINDOW      UTC hours in which the pool is refilled, as
+                            ``start-end`` (e.g. ``1-6``, or ``22-5`` across
+                            midnight); empty means any time
+    POOL_REFILL_INTERVAL    seconds the worker waits between two refill
+                            attempts (default 300)
+"""
+import os
+import time
+
+
+def pool_size():
+    try:
+        return max(0, int(os.getenv("POOL_SIZE", "0")))
+    except ValueError:
+        print("⚠️ Invalid POOL_SIZE, pre-generation disabled")
+        return 0
+
+
+def refill_interval():
+    try:
+        return max(0.0, float(os.getenv("POOL_REFILL_INTERVAL", "300")))
+    except ValueError:
+        return 300.0
+
+
+def refill_window():
+    """
+    Returns ``(start hour, end hour)`` or None when refilling is always allowed.
+    """
+    window = os.getenv("POOL_REFILL_WINDOW", "").strip()
+    if not window:
+        return None
+    try:
+        start, end = (int(hour) % 24 for hour in window.split("-", 1))
+    except ValueError:
+        print(f"⚠️ Invalid POOL_REFILL_WINDOW={window!r}, expected start-end hours")
+        return None
+    return start, end
+
+
+def in_refill_window(now=None):
+    window = refill_window()
+    if window is None:
+        return True
+    start, end = window
+    hour = time.gmtime(now).tm_hour
+    if start == end:
+        return True  # e.g. 0-24
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def missing_items(ready):
+    """
+    Number of items to generate given `ready` items in the pool.
+    """
+    return max(0, pool_size() - ready)
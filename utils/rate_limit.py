@@ -0,0 +1,392 @@
+"""
+Per-provider rate limiting, retries and circuit breaking for upstream calls.
+
+Each provider (``zai``, ``hf``, ``hashnode``, ``r2``, ``upload``) gets a token bucket that
+paces outgoing calls, a retry policy with jittered exponential backoff that
+honours ``Retry-After``, and one circuit breaker per endpoint so an endpoint
+that keeps failing is skipped for a while instead of being hammered.
+
+Environment variables (``<P>`` is the upper-cased provider name):
+    RATE_LIMIT_<P>              ``rate/burst`` in requests per second, e.g. ``2/5``
+                                (default: unlimited)
+    <P>_RETRY_ATTEMPTS          total attempts per call (default RETRY_ATTEMPTS or 3)
+    RETRY_BASE_DELAY            first backoff step in seconds (default 1)
+    RETRY_MAX_DELAY             cap of a single backoff sleep (default 30)
+    CIRCUIT_FAILURE_THRESHOLD   consecutive failures that open a circuit (default 5)
+    CIRCUIT_RESET_TIMEOUT       seconds before an open circuit lets a probe through
+                                (default 60)
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Retried for idempotent requests.
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# Non-idempotent calls (createDraft, publishDraft) are only retried when the
+# request was refused before being processed: a 429, or a 503 carrying
+# Retry-After. A gateway 502/504 says nothing about whether the origin ran it.
+MUTATION_RETRY_STATUSES = frozenset({429})
+MUTATION_RETRY_AFTER_STATUSES = frozenset({503})
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an endpoint whose circuit is open.
+    """
+
+
+class RateLimitTimeout(Exception):
+    """
+    Raised when no token became available within the wait limit.
+    """
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return float(default)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket; `rate` tokens per second up to `burst`.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """
+        Takes a token if one is available. Returns 0, or the seconds to wait
+        before trying again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self._blocked_until and self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+
+    def acquire(self, timeout=None):
+        """
+        Blocks until a token is available; returns the seconds waited.
+        """
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return time.monotonic() - started
+            if timeout is not None and time.monotonic() - started + wait > timeout:
+                raise RateLimitTimeout(f"No rate limit token within {timeout}s")
+            time.sleep(wait)
+
+    async def aacquire(self):
+        """
+        Async acquire; waits without blocking the event loop.
+        """
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return time.monotonic() - started
+            await asyncio.sleep(wait)
+
+    def block_for(self, seconds):
+        """
+        Holds back every caller for `seconds`, e.g. after a 429 Retry-After.
+        """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """
+        True if a call may go through. Once the reset timeout has passed a
+        single probe is let through; its outcome closes or re-opens the circuit.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.opened_at = time.monotonic()  # one probe per reset period
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class Provider:
+    def __init__(self, name):
+        self.name = name
+        prefix = name.upper()
+
+        self.bucket = None
+        limit = os.getenv(f"RATE_LIMIT_{prefix}")
+        if limit:
+            try:
+                rate, _, burst = limit.partition("/")
+                self.bucket = TokenBucket(float(rate), int(burst or 1))
+            except ValueError:
+                print(f"⚠️ Invalid RATE_LIMIT_{prefix}={limit!r}, expected rate/burst")
+
+        self.attempts = max(1, int(_env_float(f"{prefix}_RETRY_ATTEMPTS", os.getenv("RETRY_ATTEMPTS", "3"))))
+        self.base_delay = _env_float("RETRY_BASE_DELAY", "1")
+        self.max_delay = _env_float("RETRY_MAX_DELAY", "30")
+        self.failure_threshold = int(_env_float("CIRCUIT_FAILURE_THRESHOLD", "5"))
+        self.reset_timeout = _env_float("CIRCUIT_RESET_TIMEOUT", "60")
+
+        self.breakers = {}
+        self.counters = {"calls": 0, "retries": 0, "throttled_s": 0.0, "rejected": 0}
+        self._lock = threading.Lock()
+
+    def breaker(self, key):
+        with self._lock:
+            breaker = self.breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self.breakers[key] = breaker
+            return breaker
+
+    def _count(self, field, amount=1):
+        with self._lock:
+            self.counters[field] += amount
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Seconds to sleep before retry number `attempt` (1-based).
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counters,
+                "throttled_s": round(self.counters["throttled_s"], 3),
+                "circuits": {key: breaker.state for key, breaker in self.breakers.items()},
+            }
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name):
+    with _providers_lock:
+        provider = _providers.get(name)
+        if provider is None:
+            provider = Provider(name)
+            _providers[name] = provider
+        return provider
+
+
+def retry_after_seconds(value):
+    """
+    Parses a Retry-After header (delta seconds or HTTP date).
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_failure(status_code):
+    return status_code == 404 or status_code == 429 or status_code >= 500
+
+
+def _check_circuit(provider, breaker, key):
+    if not breaker.allow():
+        provider._count("rejected")
+        raise CircuitOpenError(f"Circuit open for {key}, skipping call")
+
+
+def _retry_delay(provider, breaker, response, attempt, idempotent=True):
+    """
+    Records the outcome of `response`; returns the seconds to wait before the
+    next attempt, or None if it should be returned to the caller.
+    """
+    status_code = getattr(response, "status_code", 200)
+    if _is_failure(status_code):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    if attempt == provider.attempts:
+        return None
+
+    retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+    if idempotent:
+        retry = status_code in RETRY_STATUSES
+    else:
+        retry = status_code in MUTATION_RETRY_STATUSES or (
+            status_code in MUTATION_RETRY_AFTER_STATUSES and retry_after is not None
+        )
+    if not retry:
+        return None
+
+    if retry_after is not None and provider.bucket is not None:
+        provider.bucket.block_for(retry_after)
+    delay = provider.backoff(attempt, retry_after)
+    print(f"🔁 {provider.name} returned {status_code}, retrying in {delay:.1f}s")
+    return delay
+
+
+def call(provider_name, func, key=None, retry_exceptions=(), idempotent=True):
+    """
+    Calls ``func()`` under the provider's rate limit, retry policy and the
+    circuit breaker for `key` (defaults to the provider itself).
+
+    `func` returns a response object with ``status_code`` and ``headers``;
+    responses with a status in RETRY_STATUSES (MUTATION_RETRY_STATUSES when
+    not `idempotent`) and exceptions listed in `retry_exceptions` are
+    retried. The last response is returned as is once attempts run out; the
+    last exception is re-raised.
+    """
+    provider = get_provider(provider_name)
+    key = key or provider_name
+    breaker = provider.breaker(key)
+
+    for attempt in range(1, provider.attempts + 1):
+        _check_circuit(provider, breaker, key)
+        if provider.bucket is not None:
+            provider._count("throttled_s", provider.bucket.acquire())
+        provider._count("calls")
+
+        try:
+            response = func()
+        except retry_exceptions as e:
+            breaker.record_failure()
+            if attempt == provider.attempts:
+                raise
+            delay = provider.backoff(attempt)
+            print(f"🔁 {provider_name} call failed ({e}), retrying in {delay:.1f}s")
+        except Exception:
+            breaker.record_failure()
+            raise
+        else:
+            delay = _retry_delay(provider, breaker, response, attempt, idempotent)
+            if delay is None:
+                return response
+            response.close()
+
+        provider._count("retries")
+        time.sleep(delay)
+
+
+async def acall(provider_name, func, key=None, retry_exceptions=(), idempotent=True):
+    """
+    Async call: `func` is a coroutine function returning the response.
+    """
+    provider = get_provider(provider_name)
+    key = key or provider_name
+    breaker = provider.breaker(key)
+
+    for attempt in range(1, provider.attempts + 1):
+        _check_circuit(provider, breaker, key)
+        if provider.bucket is not None:
+            provider._count("throttled_s", await provider.bucket.aacquire())
+        provider._count("calls")
+
+        try:
+            response = await func()
+        except retry_exceptions as e:
+            breaker.record_failure()
+            if attempt == provider.attempts:
+                raise
+            delay = provider.backoff(attempt)
+            print(f"🔁 {provider_name} call failed ({e}), retrying in {delay:.1f}s")
+        except Exception:
+            breaker.record_failure()
+            raise
+        else:
+            delay = _retry_delay(provider, breaker, response, attempt, idempotent)
+            if delay is None:
+                return response
+            await response.aclose()
+
+        provider._count("retries")
+        await asyncio.sleep(delay)
+
+
+def limited(provider_name, key=None):
+    """
+    Context manager applying only the rate limit and circuit breaker, for
+    clients that do their own retries (boto3). Any exception counts as a
+    failure for the circuit.
+    """
+    return _Limited(get_provider(provider_name), key or provider_name)
+
+
+class _Limited:
+    def __init__(self, provider, key):
+        self.provider = provider
+        self.breaker = provider.breaker(key)
+        self.key = key
+
+    def __enter__(self):
+        if not self.breaker.allow():
+            self.provider._count("rejected")
+            raise CircuitOpenError(f"Circuit open for {self.key}, skipping call")
+        if self.provider.bucket is not None:
+            self.provider._count("throttled_s", self.provider.bucket.acquire())
+        self.provider._count("calls")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        return False
+
+
+def stats():
+    with _providers_lock:
+        providers = dict(_providers)
+    return {name: provider.stats() for name, provider in providers.items()}
@@ -0,0 +1,208 @@
+"""
+Single-flight guard for post generation runs.
+
+A run holds one of PIPELINE_MAX_CONCURRENT lease slots, stored in a local
+SQLite file so the app's processes and the worker on the same machine see
+the same leases. A trigger that arrives while a run started less than
+PIPELINE_COALESCE_WINDOW seconds ago is in flight, or when every slot is
+taken, attaches to that run and gets its result instead of starting a
+duplicate one.
+
+Leases expire after PIPELINE_LEASE_TTL seconds unless renewed (runs renew
+theirs after every stage), so a crashed run does not block the next ones.
+
+Environment variables:
+    PIPELINE_MAX_CONCURRENT     runs allowed at the same time (default 1)
+    PIPELINE_LEASE_TTL          seconds a lease lives without renewal (default 600)
+    PIPELINE_COALESCE_WINDOW    max age in seconds of an in-flight run that new
+                                triggers attach to (default 600; 0 = only when
+                                every slot is taken)
+    PIPELINE_LEASE_PATH         SQLite file (default ``leases.sqlite3`` in the
+                                local store)
+"""
+import asyncio
+import os
+import threading
+import time
+import uuid
+
+from utils.storage import connect, local_path
+
+
+class LeaseStore:
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        self._db = connect(path or os.getenv("PIPELINE_LEASE_PATH") or local_path("leases.sqlite3"))
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "name TEXT PRIMARY KEY, holder TEXT NOT NULL, job_id TEXT, "
+                "started_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def acquire(self, name, holder, ttl):
+        """
+        Takes the lease `name` if it is free or expired. Returns True on success.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            return self._db.execute(
+                "INSERT INTO leases (name, holder, job_id, started_at, expires_at) VALUES (?, ?, NULL, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, job_id = NULL, "
+                "started_at = excluded.started_at, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at <= ?",
+                (name, holder, now, now + ttl, now),
+            ).rowcount == 1
+
+    def update(self, name, holder, ttl=None, job_id=None):
+        """
+        Extends the lease by `ttl` seconds and/or records the job it runs.
+        Returns False if `holder` no longer holds it.
+        """
+        sets, params = [], []
+        if ttl is not None:
+            sets.append("expires_at = ?")
+            params.append(time.time() + ttl)
+        if job_id is not None:
+            sets.append("job_id = ?")
+            params.append(job_id)
+        if not sets:
+            return True
+        with self._lock, self._db:
+            return self._db.execute(
+                f"UPDATE leases SET {', '.join(sets)} WHERE name = ? AND holder = ?",
+                (*params, name, holder),
+            ).rowcount == 1
+
+    def release(self, name, holder):
+        # Expire rather than delete, so attached callers can still read the job id
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE leases SET expires_at = 0 WHERE name = ? AND holder = ?", (name, holder)
+            )
+
+    def get(self, name):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT name, holder, job_id, started_at, expires_at FROM leases WHERE name = ?", (name,)
+            ).fetchone()
+        return self._to_dict(row)
+
+    def active(self, prefix):
+        """
+        Returns the unexpired leases whose name starts with `prefix`, newest first.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, holder, job_id, started_at, expires_at FROM leases "
+                "WHERE name LIKE ? AND expires_at > ? ORDER BY started_at DESC",
+                (f"{prefix}%", time.time()),
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        name, holder, job_id, started_at, expires_at = row
+        return {"name": name, "holder": holder, "job_id": job_id, "started_at": started_at, "expires_at": expires_at}
+
+
+class Lease:
+    def __init__(self, store, name, holder, ttl):
+        self.store = store
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+
+    def set_job(self, job_id):
+        self.store.update(self.name, self.holder, ttl=self.ttl, job_id=job_id)
+
+    def renew(self, *args):
+        """
+        Extends the lease; accepts and ignores Pipeline.run on_stage arguments.
+        """
+        if not self.store.update(self.name, self.holder, ttl=self.ttl):
+            print(f"⚠️ Lost lease {self.name}, another run may have started")
+
+    def release(self):
+        self.store.release(self.name, self.holder)
+
+
+class SingleFlight:
+    def __init__(self, store=None, prefix="pipeline", max_concurrent=None, ttl=None, window=None):
+        self.store = store or LeaseStore()
+        self.prefix = prefix
+        self.max_concurrent = max(1, max_concurrent or int(os.getenv("PIPELINE_MAX_CONCURRENT", "1")))
+        self.ttl = ttl or float(os.getenv("PIPELINE_LEASE_TTL", "600"))
+        self.window = float(os.getenv("PIPELINE_COALESCE_WINDOW", "600")) if window is None else window
+
+    def claim(self, job_id=None):
+        """
+        Decides what a new trigger does. A trigger for a given `job_id` only
+        attaches to a run of that same job.
+
+        Returns:
+            tuple: ``("run", Lease)`` to start a run, ``("attach", lease)``
+            with the in-flight run's lease row to wait for, or
+            ``("busy", None)`` when every slot is taken and coalescing is off.
+        """
+        active = self.store.active(self.prefix)
+        if job_id is not None:
+            running = [lease for lease in active if lease["job_id"] == job_id]
+            if running:
+                return "attach", running[0]
+        elif active and time.time() - active[0]["started_at"] < self.window:
+            return "attach", active[0]
+
+        holder = uuid.uuid4().hex
+        for slot in range(self.max_concurrent):
+            name = f"{self.prefix}:{slot}"
+            if self.store.acquire(name, holder, self.ttl):
+                return "run", Lease(self.store, name, holder, self.ttl)
+
+        active = self.store.active(self.prefix)
+        if active and job_id is None and self.window > 0:
+            return "attach", active[0]
+        return "busy", None
+
+    def poll(self, lease):
+        """
+        Returns ``(finished, job_id)`` for an attached `lease` row: finished
+        once its holder released it, lost it or let it expire.
+        """
+        current = self.store.get(lease["name"])
+        if current is None or current["holder"] != lease["holder"]:
+            return True, lease["job_id"]
+        finished = current["expires_at"] <= time.time()
+        return finished, current["job_id"] or lease["job_id"]
+
+    def join(self, lease, interval=0.5):
+        """
+        Blocks until the run holding `lease` finishes. Returns its job id.
+        """
+        while True:
+            finished, job_id = self.poll(lease)
+            if finished:
+                return job_id
+            time.sleep(interval)
+
+    async def ajoin(self, lease, interval=0.5):
+        while True:
+            finished, job_id = self.poll(lease)
+            if finished:
+                return job_id
+            await asyncio.sleep(interval)
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
@@ -0,0 +1,27 @@
+"""
+Location of the local, on-disk state (caches, job store, ...).
+
+Everything lives under ``LOCAL_STORE_DIR``, defaulting to a directory in the
+system temp folder since that is the only writable path on Vercel.
+"""
+import os
+import sqlite3
+import tempfile
+
+
+def local_path(name):
+    """
+    Returns the absolute path of `name` inside the local store directory.
+    """
+    directory = os.getenv("LOCAL_STORE_DIR") or os.path.join(tempfile.gettempdir(), "flavor-empire")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def connect(path):
+    """
+    Opens a SQLite connection that can be shared between threads.
+    """
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    return connection
@@ -0,0 +1,158 @@
+"""
+Persistence of post rows in the Supabase ``tasks`` table.
+
+Rows are addressed by primary key: ``insert`` returns the new row id and
+``update`` filters on it rather than on the unindexed title. ``WriteBehind``
+buffers the writes of a batch run and sends them as one bulk insert of new
+rows plus one bulk upsert of rows that already have an id, so a post's insert
+and its later post_url usually end up in a single write.
+
+Environment variables:
+    TASK_FLUSH_INTERVAL     max seconds a buffered write waits (default 2)
+    TASK_FLUSH_SIZE         buffered rows that trigger a flush (default 50)
+"""
+import os
+import threading
+
+from utils.tracing import span
+
+
+class TaskStore:
+    def __init__(self, client, table="tasks", on_change=None):
+        # `client` returns the Supabase client, so it is only built when used
+        self._client = client
+        self.table = table
+        # on_change(op, rows) is called after every successful write, with op
+        # "inserted" or "updated" and the written rows (ids included)
+        self.on_change = on_change
+
+    def _changed(self, op, rows):
+        if self.on_change is not None and rows:
+            self.on_change(op, rows)
+
+    def _table(self):
+        return self._client().table(self.table)
+
+    def insert(self, row):
+        """
+        Inserts `row` and returns its id.
+        """
+        return self.insert_many([row])[0]
+
+    def insert_many(self, rows):
+        """
+        Inserts `rows` in one request and returns their ids, in order.
+        """
+        with span("supabase.insert", rows=len(rows)):
+            data = self._table().insert(rows).execute().data
+        self._changed("inserted", data)
+        return [row["id"] for row in data]
+
+    def update(self, task_id, changes):
+        with span("supabase.update"):
+            self._table().update(changes).eq("id", task_id).execute()
+        self._changed("updated", [{**changes, "id": task_id}])
+
+    def id_for_title(self, title):
+        """
+        Returns the id of the newest row with `title`, or None. Only for rows
+        whose id was not recorded when they were written.
+        """
+        with span("supabase.select_id"):
+            rows = self._table().select("id").eq("title", title).order("id", desc=True).limit(1).execute().data
+        return rows[0]["id"] if rows else None
+
+    def upsert_many(self, rows):
+        """
+        Writes complete rows that already have an id in one request.
+        """
+        with span("supabase.upsert", rows=len(rows)):
+            self._table().upsert(rows, on_conflict="id").execute()
+        self._changed("updated", rows)
+
+
+class WriteBehind:
+    """
+    Buffers task rows and writes them in bulk.
+
+    ``put(key, values)`` merges `values` into the row for `key` (e.g. the job
+    id). Pending rows are flushed once `flush_size` of them are waiting,
+    `flush_interval` seconds after the first one was buffered, or on
+    ``flush()`` / ``close()``. Rows that fail to flush stay pending and their
+    errors are kept in ``errors``.
+    """
+
+    def __init__(self, store, flush_interval=None, flush_size=None, on_flush=None):
+        self.store = store
+        self.flush_interval = flush_interval or float(os.getenv("TASK_FLUSH_INTERVAL", "2"))
+        self.flush_size = max(1, flush_size or int(os.getenv("TASK_FLUSH_SIZE", "50")))
+        self.on_flush = on_flush
+        self.errors = []
+        self._rows = {}       # key -> row as last buffered, with its id once written
+        self._pending = {}    # keys with unwritten changes, in insertion order
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def put(self, key, values):
+        with self._lock:
+            self._rows.setdefault(key, {}).update(values)
+            self._pending[key] = True
+            full = len(self._pending) >= self.flush_size
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def _flush_on_timer(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def flush(self):
+        """
+        Writes every pending row. Returns False if the write failed.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                keys = list(self._pending)
+                self._pending.clear()
+                rows = {key: dict(self._rows[key]) for key in keys}
+            if not keys:
+                return True
+
+            new = [key for key in keys if "id" not in rows[key]]
+            written = [key for key in keys if "id" in rows[key]]
+            try:
+                if new:
+                    ids = self.store.insert_many([rows[key] for key in new])
+                    with self._lock:
+                        for key, task_id in zip(new, ids):
+                            self._rows[key]["id"] = task_id
+                if written:
+                    self.store.upsert_many([rows[key] for key in written])
+            except Exception as e:
+                print(f"❌ Error writing {len(keys)} buffered task rows: {e}")
+                self.errors.append(str(e))
+                with self._lock:
+                    # Rows inserted before the failure now have an id and are
+                    # upserted on the next flush
+                    for key in keys:
+                        self._pending[key] = True
+                return False
+
+        print(f"💾 Wrote {len(new)} new and {len(written)} updated task rows")
+        if self.on_flush is not None:
+            self.on_flush()
+        return True
+
+    def close(self):
+        """
+        Flushes what is left. Returns False if rows could not be written.
+        """
+        return self.flush()
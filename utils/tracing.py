@@ -0,0 +1,229 @@
+"""
+Lightweight tracing and latency metrics for the generation pipeline.
+
+Wrap any unit of work in ``with span("name") as s:`` to record its duration,
+outcome and attributes (payload sizes, endpoint, status code, ...). Spans
+nest through a context variable, so everything done for one post shares a
+trace id. Finished spans go into a bounded in-memory buffer and are
+aggregated into per-name latency histograms served by ``/api/metrics``,
+either as JSON, Prometheus text or OTLP/JSON (OpenTelemetry) spans.
+
+Environment variables:
+    TRACE_BUFFER_SIZE   number of recent spans kept (default 1000)
+"""
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds in milliseconds of the latency histogram buckets.
+LATENCY_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_recent = deque(maxlen=int(os.getenv("TRACE_BUFFER_SIZE", "1000")))
+_histograms = {}
+
+
+class Span:
+    __slots__ = ("name", "key", "trace_id", "span_id", "parent_id", "attributes",
+                 "start", "end", "duration_ms", "status", "error")
+
+    def __init__(self, name, key=None, parent=None, attributes=None):
+        self.name = name
+        self.key = key
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.end = None
+        self.duration_ms = None
+        self.status = "ok"
+        self.error = None
+
+    @property
+    def metric_name(self):
+        return f"{self.name}:{self.key}" if self.key else self.name
+
+    def set(self, **attributes):
+        """
+        Adds attributes, e.g. ``s.set(response_bytes=len(body), status=200)``.
+        """
+        self.attributes.update(attributes)
+
+    def fail(self, error):
+        """
+        Marks the span as failed without raising, for calls that return None.
+        """
+        self.status = "error"
+        self.error = str(error)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "key": self.key,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+def _record(finished):
+    with _lock:
+        _recent.append(finished)
+        histogram = _histograms.setdefault(finished.metric_name, {
+            "count": 0,
+            "errors": 0,
+            "sum_ms": 0.0,
+            "max_ms": 0.0,
+            "bytes": 0,
+            "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        })
+        histogram["count"] += 1
+        histogram["errors"] += finished.status == "error"
+        histogram["sum_ms"] += finished.duration_ms
+        histogram["max_ms"] = max(histogram["max_ms"], finished.duration_ms)
+        histogram["bytes"] += finished.attributes.get("request_bytes", 0) + finished.attributes.get("response_bytes", 0)
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if finished.duration_ms <= bound:
+                histogram["buckets"][index] += 1
+                break
+        else:
+            histogram["buckets"][-1] += 1
+
+
+@contextmanager
+def span(name, key=None, **attributes):
+    """
+    Records the enclosed block as a span named `name`.
+
+    `key` splits the latency histogram further (e.g. per endpoint). An
+    exception marks the span as failed and is re-raised.
+    """
+    current = Span(name, key=key, parent=_current_span.get(), attributes=attributes)
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end = time.time()
+        current.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        _record(current)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def recent_spans(limit=100, trace_id=None):
+    with _lock:
+        spans = [s for s in _recent if trace_id is None or s.trace_id == trace_id]
+    return [s.to_dict() for s in spans[-limit:]]
+
+
+def _percentile(histogram, fraction):
+    """
+    Estimates a percentile as the upper bound of the bucket containing it.
+    """
+    target = histogram["count"] * fraction
+    seen = 0
+    for index, count in enumerate(histogram["buckets"]):
+        seen += count
+        if count and seen >= target:
+            return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else histogram["max_ms"]
+    return None
+
+
+def metrics_snapshot():
+    """
+    Returns per-span-name latency histograms with estimated percentiles.
+    """
+    with _lock:
+        histograms = {name: {**h, "buckets": list(h["buckets"])} for name, h in _histograms.items()}
+
+    for histogram in histograms.values():
+        histogram["avg_ms"] = round(histogram["sum_ms"] / histogram["count"], 2)
+        histogram["sum_ms"] = round(histogram["sum_ms"], 2)
+        histogram["p50_ms"] = _percentile(histogram, 0.50)
+        histogram["p95_ms"] = _percentile(histogram, 0.95)
+        histogram["p99_ms"] = _percentile(histogram, 0.99)
+        histogram["buckets"] = {
+            **{f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS_MS, histogram["buckets"])},
+            "le_inf": histogram["buckets"][-1],
+        }
+    return histograms
+
+
+def prometheus_text():
+    """
+    Renders the histograms in the Prometheus text exposition format.
+    """
+    lines = [
+        "# HELP pipeline_span_duration_ms Duration of pipeline spans in milliseconds.",
+        "# TYPE pipeline_span_duration_ms histogram",
+    ]
+    with _lock:
+        items = [(name, dict(h, buckets=list(h["buckets"]))) for name, h in sorted(_histograms.items())]
+    for name, histogram in items:
+        label = name.replace("\\", "\\\\").replace('"', '\\"')
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, histogram["buckets"]):
+            cumulative += count
+            lines.append(f'pipeline_span_duration_ms_bucket{{span="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'pipeline_span_duration_ms_bucket{{span="{label}",le="+Inf"}} {histogram["count"]}')
+        lines.append(f'pipeline_span_duration_ms_sum{{span="{label}"}} {histogram["sum_ms"]}')
+        lines.append(f'pipeline_span_duration_ms_count{{span="{label}"}} {histogram["count"]}')
+        lines.append(f'pipeline_span_errors_total{{span="{label}"}} {histogram["errors"]}')
+    return "\n".join(lines) + "\n"
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_spans(limit=500):
+    """
+    Returns recent spans as an OTLP/JSON ``ExportTraceServiceRequest`` body,
+    ready to POST to an OpenTelemetry collector's ``/v1/traces``.
+    """
+    spans = []
+    for item in recent_spans(limit):
+        attributes = dict(item["attributes"])
+        if item["key"]:
+            attributes["key"] = item["key"]
+        spans.append({
+            "traceId": item["trace_id"],
+            "spanId": item["span_id"],
+            "parentSpanId": item["parent_id"] or "",
+            "name": item["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(int(item["start"] * 1e9)),
+            "endTimeUnixNano": str(int((item["start"] + item["duration_ms"] / 1000) * 1e9)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()],
+            "status": {"code": 2, "message": item["error"]} if item["status"] == "error" else {"code": 1},
+        })
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "flavor-empire-ai-bot"}}]},
+            "scopeSpans": [{"scope": {"name": "utils.tracing"}, "spans": spans}],
+        }]
+    }
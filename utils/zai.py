@@ -0,0 +1,171 @@
+"""
+Shared client for the Z.ai chat-completions API.
+
+Holds the endpoint, headers and sampling settings that every text generation
+call uses, so idea, post, streaming and single-round-trip generation don't
+each rebuild them.
+
+Environment variables:
+    ZAI_API_KEY     API key (required)
+    ZAI_MODEL       chat model (default glm-4.5-flash)
+"""
+import json
+import os
+
+from prompts import prompt_size
+from utils import async_http, http_client
+from utils.cache import get_cache
+from utils.tracing import span
+
+ZAI_CHAT_URL = "https://api.z.ai/api/paas/v4/chat/completions"
+
+
+class StreamError(Exception):
+    """
+    A streamed completion failed or ended before the model finished.
+    """
+
+
+class ZAIClient:
+    def __init__(self, api_key, model=None, temperature=0.7, top_p=0.8):
+        self.api_key = api_key
+        self.model = model or os.getenv("ZAI_MODEL", "glm-4.5-flash")
+        self.temperature = temperature
+        self.top_p = top_p
+
+    def headers(self, stream=False):
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}",
+        }
+        if stream:
+            headers["Accept"] = "text/event-stream"
+        return headers
+
+    def payload(self, messages, **options):
+        """
+        Request body for `messages`; `options` are extra API fields such as
+        ``response_format`` or ``stream``.
+        """
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            **options,
+        }
+
+    def complete(self, messages, span_name="zai.complete", cache=False, fresh=False, **options):
+        """
+        Returns the assistant message content for `messages`, or None on error.
+
+        With `cache` the completion is served from the "zai" response cache
+        namespace for an identical payload, unless `fresh` is set.
+        """
+        import requests
+
+        data = self.payload(messages, **options)
+
+        def call():
+            with span(span_name, model=self.model, prompt_tokens=prompt_size(messages)["tokens"]) as s:
+                try:
+                    response = http_client.post(ZAI_CHAT_URL, provider="zai", headers=self.headers(), json=data)
+                    s.set(status_code=response.status_code, response_bytes=len(response.content))
+                    response.raise_for_status()
+                    return response.json()["choices"][0]["message"]["content"]
+                except requests.exceptions.RequestException as e:
+                    print(f"❌ Error calling Z.ai ({span_name}): {e}")
+                    s.fail(e)
+                    return None
+                except (json.JSONDecodeError, KeyError, IndexError) as e:
+                    print(f"❌ Error decoding Z.ai response: {e}")
+                    s.fail(e)
+                    return None
+
+        if not cache:
+            return call()
+        return get_cache().get_or_set("zai", data, call, bypass=fresh)
+
+    async def acomplete(self, messages, span_name="zai.complete", cache=False, fresh=False, **options):
+        """
+        Async complete() over the shared httpx client.
+        """
+        import httpx
+
+        data = self.payload(messages, **options)
+
+        async def call():
+            with span(span_name, model=self.model, prompt_tokens=prompt_size(messages)["tokens"]) as s:
+                try:
+                    response = await async_http.post(ZAI_CHAT_URL, provider="zai", headers=self.headers(), json=data)
+                    s.set(status_code=response.status_code, response_bytes=len(response.content))
+                    response.raise_for_status()
+                    return response.json()["choices"][0]["message"]["content"]
+                except httpx.HTTPError as e:
+                    print(f"❌ Error calling Z.ai ({span_name}): {e}")
+                    s.fail(e)
+                    return None
+                except (json.JSONDecodeError, KeyError, IndexError) as e:
+                    print(f"❌ Error decoding Z.ai response: {e}")
+                    s.fail(e)
+                    return None
+
+        if not cache:
+            return await call()
+        return await get_cache().aget_or_set("zai", data, call, bypass=fresh)
+
+    def stream(self, messages, **options):
+        """
+        Yields content chunks as they arrive (SSE ``stream: true``).
+
+        Raises StreamError if the request fails, a chunk cannot be decoded or
+        the stream ends without ``[DONE]`` or a ``finish_reason``, so a
+        response cut short is never taken for a complete one.
+        """
+        import requests
+
+        data = self.payload(messages, stream=True, **options)
+        finished = False
+        try:
+            with http_client.post(
+                ZAI_CHAT_URL,
+                provider="zai",
+                headers=self.headers(stream=True),
+                json=data,
+                stream=True
+            ) as response:
+                response.raise_for_status()
+                for raw_line in response.iter_lines():
+                    line = raw_line.decode("utf-8")
+                    if not line.startswith("data:"):
+                        continue
+                    chunk = line[len("data:"):].strip()
+                    if chunk == "[DONE]":
+                        finished = True
+                        break
+                    choice = json.loads(chunk)["choices"][0]
+                    delta = choice.get("delta", {})
+                    if delta.get("content"):
+                        yield delta["content"]
+                    if choice.get("finish_reason"):
+                        finished = True
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Error streaming from Z.ai: {e}")
+            raise StreamError(f"Z.ai stream failed: {e}") from e
+        except (json.JSONDecodeError, KeyError, IndexError) as e:
+            print(f"❌ Error decoding stream chunk: {e}")
+            raise StreamError(f"Could not decode Z.ai stream chunk: {e}") from e
+        if not finished:
+            print("❌ Z.ai stream ended before the response was complete")
+            raise StreamError("Z.ai stream ended before the response was complete")
+
+
+def get_zai_client():
+    """
+    Returns a ZAIClient, or None if ZAI_API_KEY is not set.
+    """
+    zai_api_key = os.getenv("ZAI_API_KEY")
+    if not zai_api_key:
+        print("❌ Error: ZAI_API_KEY environment variable not set")
+        return None
+    return ZAIClient(zai_api_key)
@@ -0,0 +1,94 @@
+"""
+Background worker draining the local job queue.
+
+Usage:
+    python worker.py [--concurrency N] [--poll-interval SECONDS] [--once]
+
+Jobs are queued through ``POST /api/jobs`` (or ``/api/scheduled-call?enqueue=1``)
+and their progress can be followed with ``GET /api/jobs/<id>``.
+
+With POOL_SIZE set the worker also keeps the pre-generation pool filled
+during POOL_REFILL_WINDOW (see ``utils.pool``), one item at a time.
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+
+from app import refill_pool, run_post_job
+from utils import http_client
+from utils.jobs import get_job_store
+from utils.pool import pool_size, refill_interval
+
+
+def process(job, slots):
+    try:
+        job, outcome = run_post_job(job)
+        if outcome.ok:
+            print(f"✅ Job {job['id']} published: {outcome.results['publish'].get('url')}")
+        else:
+            print(f"❌ Job {job['id']} failed at '{outcome.failed_stage}': {outcome.error}")
+    except Exception as e:
+        print(f"❌ Job {job['id']} crashed: {e}")
+    finally:
+        slots.release()
+
+
+def refill_forever():
+    while True:
+        try:
+            refill_pool(max_items=1)
+        except Exception as e:
+            print(f"❌ Pool refill crashed: {e}")
+        time.sleep(max(refill_interval(), 1))
+
+
+def run(concurrency, poll_interval, once=False):
+    store = get_job_store()
+    stale = store.fail_stale(float(os.getenv("JOB_STALE_AFTER", "900")))
+    if stale:
+        print(f"⚠️ Marked {stale} stalled job(s) as failed")
+
+    if pool_size() and not once:
+        threading.Thread(target=refill_forever, name="pool-refill", daemon=True).start()
+        print(f"📦 Keeping {pool_size()} pre-generated posts ready")
+
+    print(f"👷 Worker started with concurrency {concurrency}")
+    slots = BoundedSemaphore(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            slots.acquire()
+            job = store.claim_next()
+            if job is None:
+                slots.release()
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+            print(f"▶️ Running job {job['id']}")
+            executor.submit(process, job, slots)
+    http_client.close_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued post generation jobs.")
+    parser.add_argument(
+        "--concurrency", type=int, default=int(os.getenv("WORKER_CONCURRENCY", "2")),
+        help="number of jobs processed at the same time (default: WORKER_CONCURRENCY or 2)",
+    )
+    parser.add_argument(
+        "--poll-interval", type=float, default=float(os.getenv("WORKER_POLL_INTERVAL", "2")),
+        help="seconds to wait when the queue is empty (default: 2)",
+    )
+    parser.add_argument("--once", action="store_true", help="exit once the queue is empty")
+    args = parser.parse_args()
+    try:
+        run(max(1, args.concurrency), args.poll_interval, once=args.once)
+    except KeyboardInterrupt:
+        print("👋 Worker stopped")
+
+
+if __name__ == "__main__":
+    main()